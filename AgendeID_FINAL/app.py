@@ -1,17 +1,27 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, session
+from flask import Flask, Response, render_template, request, jsonify, redirect, url_for, session, g
 from flask_cors import CORS
 from flask_wtf.csrf import CSRFProtect
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from datetime import timedelta, date, datetime
+from typing import Iterator, Optional, Tuple
+import csv
+import hmac
+import io
+import json
 import os
+import uuid
 from dotenv import load_dotenv
 import logging
 
 from backend.chatbot import Chatbot
+from backend.senhas import pool_senhas
 from backend.database import (
     criar_banco, autenticar_usuario, obter_usuario, executar_consulta, 
-    obter_horarios_disponiveis, cadastrar_usuario
+    obter_horarios_disponiveis, cadastrar_usuario, normalizar_data, data_para_iso,
+    obter_disponibilidade_periodo, proximos_horarios_livres,
+    pagina_relatorio_agendamentos, iterar_relatorio_agendamentos, CAMPOS_RELATORIO_AGENDAMENTOS,
+    reconstruir_estatisticas_diarias, relatorio_em_cache, cache_relatorios, listar_agendamentos_usuario
 )
 
 # Carregar variáveis de ambiente do arquivo .env
@@ -30,11 +40,18 @@ CORS(app)
 csrf = CSRFProtect(app)
 
 # Limitação de requisições
-limiter = Limiter(app=app, key_func=get_remote_address, default_limits=["500 per day", "100 per hour"])
+LIMITES_PADRAO = ["500 per day", "100 per hour"]
+LIMITE_CHAT = "30 per minute"
+# AGENDEID_LIMITES=0 desliga os limites (ex: testes de carga locais, todos vindos do mesmo IP)
+limiter = Limiter(
+    app=app, key_func=get_remote_address, default_limits=LIMITES_PADRAO,
+    enabled=os.environ.get('AGENDEID_LIMITES', '1') != '0'
+)
 
 # Configuração de sessão
+# AGENDEID_COOKIE_SEGURO=0 permite o cookie de sessão em HTTP sem TLS (somente uso local)
 app.config.update(
-    SESSION_COOKIE_SECURE=True,
+    SESSION_COOKIE_SECURE=os.environ.get('AGENDEID_COOKIE_SEGURO', '1') != '0',
     SESSION_COOKIE_HTTPONLY=True,
     SESSION_COOKIE_SAMESITE='Lax',
     PERMANENT_SESSION_LIFETIME=timedelta(hours=2)
@@ -43,7 +60,10 @@ app.config.update(
 # Cabeçalhos de segurança
 @app.after_request
 def adicionar_cabecalhos_seguranca(resposta):
-    resposta.headers['Access-Control-Allow-Origin'] = request.headers.get('Origin', '*')
+    return aplicar_cabecalhos_seguranca(resposta, request.headers.get('Origin', '*'))
+
+def aplicar_cabecalhos_seguranca(resposta, origem: str):
+    resposta.headers['Access-Control-Allow-Origin'] = origem
     resposta.headers['Access-Control-Allow-Credentials'] = 'true'
     resposta.headers['Access-Control-Allow-Headers'] = 'Content-Type,Authorization,X-CSRFToken'
     resposta.headers['Access-Control-Allow-Methods'] = 'GET,PUT,POST,DELETE,OPTIONS'
@@ -57,11 +77,20 @@ def adicionar_cabecalhos_seguranca(resposta):
 chatbot = Chatbot()
 app.config['chatbot'] = chatbot
 
+# Um banco com migrações pendentes (sem o índice de reserva única, sem versao_dados...) não
+# atende requisições: a importação falha e o servidor não sobe, inclusive pelo asgi.py
 with app.app_context():
-    if criar_banco():
-        app.logger.info("Banco de dados inicializado ou já existente.")
-    else:
+    if not criar_banco():
         app.logger.error("Falha ao inicializar o banco de dados.")
+        raise RuntimeError("Falha ao inicializar o banco de dados; o servidor não será iniciado.")
+    app.logger.info("Banco de dados inicializado ou já existente.")
+
+# Perfil do usuário memorizado durante a requisição; entre requisições vale o cache de obter_usuario
+def usuario_da_requisicao(email: str):
+    usuarios = g.setdefault('usuarios', {})
+    if email not in usuarios:
+        usuarios[email] = obter_usuario(email)
+    return usuarios[email]
 
 # Rotas
 @app.route("/")
@@ -72,7 +101,7 @@ def rota_principal():
 
     # Verifica se o usuário está logado corretamente
     if isinstance(usuario_sessao, dict) and "email" in usuario_sessao and tipo_usuario:
-        usuario_validado = obter_usuario(usuario_sessao["email"])
+        usuario_validado = usuario_da_requisicao(usuario_sessao["email"])
         if usuario_validado:
             # Redireciona com base no tipo de usuário
             if tipo_usuario == "cliente":
@@ -95,7 +124,7 @@ def painel_cliente():
     email_usuario = usuario_info.get('email') if isinstance(usuario_info, dict) else usuario_info
 
     # Busca os dados do usuário no banco
-    usuario = obter_usuario(email_usuario)
+    usuario = usuario_da_requisicao(email_usuario)
 
     # Se o usuário não for encontrado, limpa a sessão e volta à tela inicial
     if not usuario:
@@ -116,49 +145,57 @@ def painel_funcionario():
     return render_template("painel_funcionario.html")
 
 @app.route("/chat", methods=["POST"])
-@limiter.limit("30 per minute")
+@limiter.limit(LIMITE_CHAT)
 @csrf.exempt
 def processar_chat():
+    dados = request.get_json(silent=True) if request.is_json else None
+    corpo, codigo = responder_chat(dados, session)
+    return jsonify(corpo), codigo
+
+# As funções responder_chat, consultar_disponibilidade e montar_relatorio recebem os dados
+# já lidos da requisição e a sessão e devolvem (corpo, código HTTP), sem usar o contexto do
+# Flask; assim as mesmas regras atendem as rotas WSGI e o modo assíncrono (asgi.py).
+def responder_chat(dados: Optional[dict], sessao) -> Tuple[dict, int]:
     try:
         # Verifica se a requisição é JSON
-        if not request.is_json:
-            return jsonify({"resposta": "Requisição deve ser JSON"}), 400
+        if not isinstance(dados, dict):
+            return {"resposta": "Requisição deve ser JSON"}, 400
 
-        dados = request.get_json()
-        mensagem = dados.get("mensagem", "").strip()
+        mensagem = str(dados.get("mensagem", "")).strip()
 
         # Mensagem obrigatória
         if not mensagem:
-            return jsonify({"resposta": "Campo 'mensagem' é obrigatório"}), 400
+            return {"resposta": "Campo 'mensagem' é obrigatório"}, 400
 
         # Inicializa o email do usuário (real ou temporário)
         email_usuario = None
 
         # Se já estiver logado, usa o e-mail da sessão
-        if 'usuario' in session:
-            email_usuario = session["usuario"]["email"]
+        if 'usuario' in sessao:
+            email_usuario = sessao["usuario"]["email"]
         else:
-            # Tenta identificar se há fluxo de login ou cadastro em andamento
-            for email_temp, estado in chatbot.estados.items():
-                if estado.get('etapa', '').startswith(('login', 'cadastro')):
-                    email_usuario = email_temp
-                    break
+            # Fluxo de login ou cadastro iniciado por este navegador, se ainda estiver ativo
+            fluxo_temp = sessao.get('fluxo_temp')
+            if fluxo_temp and fluxo_temp in chatbot.estados:
+                email_usuario = fluxo_temp
+            elif fluxo_temp:
+                sessao.pop('fluxo_temp', None)
 
         # Permite saudações sem login
         if not email_usuario and mensagem.lower() in ['oi', 'olá', 'ola', 'bom dia', 'boa tarde', 'boa noite']:
-            return jsonify({"resposta": "Olá! Para continuar, digite 'Login' ou 'Cadastro'."})
+            return {"resposta": "Olá! Para continuar, digite 'Login' ou 'Cadastro'."}, 200
 
         # Inicia fluxo de login/cadastro gerando um email temporário
         if not email_usuario and mensagem.lower() in ['login', 'cadastro']:
-            import uuid
-            email_usuario = f"temp_{uuid.uuid4().hex[:8]}"
+            email_usuario = f"temp_{uuid.uuid4().hex}"
+            sessao['fluxo_temp'] = email_usuario
 
         # Se ainda não há email associado, bloqueia
         if not email_usuario:
-            return jsonify({
+            return {
                 "resposta": "Você precisa estar logado para usar o chat. Digite 'Login' ou 'Cadastro'.",
                 "redirect": "/"
-            }), 403
+            }, 403
 
         # Envia a mensagem para o chatbot
         resposta = chatbot.processar_mensagem(mensagem, email_usuario)
@@ -167,28 +204,29 @@ def processar_chat():
         if isinstance(resposta, dict) and resposta.get('login'):
             usuario = resposta.get('usuario')
             if usuario:
-                session['usuario'] = {
+                sessao['usuario'] = {
                     "email": usuario['email'],
                     "nome": usuario['nome'],
                     "tipo": usuario['tipo']
                 }
-                session['tipo'] = usuario['tipo']
-                session.permanent = True
+                sessao['tipo'] = usuario['tipo']
+                sessao.permanent = True
 
                 # Limpa estado de login temporário
                 if email_usuario.startswith('temp_'):
                     chatbot.estados.pop(email_usuario, None)
+                    sessao.pop('fluxo_temp', None)
 
         # Se for logout, limpa sessão e estado do chatbot
         if isinstance(resposta, dict) and resposta.get('logout'):
             chatbot.estados.pop(email_usuario, None)
-            session.clear()
+            sessao.clear()
 
-        return jsonify(resposta)
+        return resposta, 200
 
     except Exception as e:
         app.logger.error(f"Erro no /chat: {str(e)}", exc_info=True)
-        return jsonify({"resposta": "Erro interno no processamento da mensagem"}), 500
+        return {"resposta": "Erro interno no processamento da mensagem"}, 500
     
 @app.route("/login", methods=["POST"])
 @limiter.limit("5 per minute")
@@ -217,6 +255,9 @@ def login():
 
             # Remove qualquer estado temporário se houver
             chatbot.estados.pop(email, None)
+            fluxo_temp = session.pop('fluxo_temp', None)
+            if fluxo_temp:
+                chatbot.estados.pop(fluxo_temp, None)
 
             app.logger.info(f"Usuário {email} logado com sucesso.")
             return jsonify({
@@ -322,7 +363,7 @@ def cadastro():
         )
 
         if user_id:
-            usuario = obter_usuario(email)
+            usuario = usuario_da_requisicao(email)
             session['usuario'] = usuario['email']
             session['tipo'] = usuario['tipo']
             session.permanent = True
@@ -344,90 +385,265 @@ def cadastro():
 
 @app.route("/agendamentos/disponiveis", methods=["GET"])
 def get_horarios_disponiveis():
-    data_str = request.args.get("data")
+    corpo, codigo = consultar_disponibilidade(request.args)
+    return jsonify(corpo), codigo
+
+def consultar_disponibilidade(parametros) -> Tuple[dict, int]:
+    data_str = parametros.get("data")
+    inicio_str = parametros.get("inicio")
+    fim_str = parametros.get("fim")
+    proximos = parametros.get("proximos")
+
+    # Disponibilidade de um período: ?inicio=DD/MM/AAAA&fim=DD/MM/AAAA
+    if inicio_str or fim_str:
+        if not inicio_str or not fim_str:
+            return {"error": "Parâmetros 'inicio' e 'fim' devem ser informados juntos."}, 400
+        if not chatbot.validarDado('data', inicio_str) or not chatbot.validarDado('data', fim_str):
+            return {"error": "Formato de data inválido. Use DD/MM/AAAA."}, 400
+        try:
+            dias = obter_disponibilidade_periodo(inicio_str, fim_str)
+        except ValueError as e:
+            return {"error": str(e)}, 400
+        except Exception as e:
+            app.logger.error(f"Erro ao buscar disponibilidade do período: {str(e)}", exc_info=True)
+            return {"error": "Erro interno ao buscar horários."}, 500
+        return {
+            "periodo": {"inicio": normalizar_data(inicio_str), "fim": normalizar_data(fim_str)},
+            "dias": dias
+        }, 200
 
     if not data_str:
-        return jsonify({"error": "Parâmetro 'data' é obrigatório."}), 400
+        return {"error": "Parâmetro 'data' é obrigatório."}, 400
 
     if not chatbot.validarDado('data', data_str):
-        return jsonify({"error": "Formato de data inválido. Use DD/MM/AAAA."}), 400
+        return {"error": "Formato de data inválido. Use DD/MM/AAAA."}, 400
 
     try:
+        # Próximos N horários livres a partir da data: ?data=DD/MM/AAAA&proximos=N
+        if proximos:
+            if not proximos.isdigit() or not 1 <= int(proximos) <= 50:
+                return {"error": "Parâmetro 'proximos' deve ser um número entre 1 e 50."}, 400
+            livres = proximos_horarios_livres(data_str, int(proximos))
+            return {"data": normalizar_data(data_str), "proximos_horarios": livres}, 200
+
         horarios = obter_horarios_disponiveis(data_str)
-        return jsonify({"data": data_str, "horarios_disponiveis": horarios})
+        return {"data": data_str, "horarios_disponiveis": horarios}, 200
     except Exception as e:
         app.logger.error(f"Erro ao buscar horários: {str(e)}", exc_info=True)
-        return jsonify({"error": "Erro interno ao buscar horários."}), 500
+        return {"error": "Erro interno ao buscar horários."}, 500
 
 @app.route("/relatorios", methods=["GET"])
 def gerar_relatorio():
-    if 'usuario' not in session or session.get('tipo') != 'funcionario':
-        return jsonify({"error": "Acesso negado. Apenas funcionários podem gerar relatórios."}), 403
-
-    tipo_relatorio = request.args.get("tipo", "completo")
-    data_inicio_str = request.args.get("data_inicio")
-    data_fim_str = request.args.get("data_fim")
+    corpo, codigo = montar_relatorio(request.args, session)
+    if isinstance(corpo, ExportacaoRelatorio):
+        return Response(corpo.partes(), status=codigo, mimetype=corpo.mimetype, headers=corpo.cabecalhos())
+    return jsonify(corpo), codigo
+
+# Tamanho padrão e máximo de uma página do relatório completo em JSON
+LIMITE_PAGINA_RELATORIO = 500
+LIMITE_MAXIMO_PAGINA_RELATORIO = 5000
+
+class ExportacaoRelatorio:
+    # Relatório completo enviado aos poucos (formato=ndjson ou formato=csv): cada parte é um
+    # lote lido do cursor, então a memória do worker não cresce com o tamanho do período
+    MIMETYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+    def __init__(self, formato: str, inicio_iso: str, fim_iso: str):
+        self.formato = formato
+        self.inicio_iso = inicio_iso
+        self.fim_iso = fim_iso
+        self.mimetype = self.MIMETYPES[formato]
+
+    def cabecalhos(self) -> dict:
+        nome_arquivo = f"agendamentos_{self.inicio_iso}_{self.fim_iso}.{self.formato}"
+        return {"Content-Disposition": f'attachment; filename="{nome_arquivo}"'}
+
+    def partes(self) -> Iterator[str]:
+        if self.formato == "csv":
+            yield ",".join(CAMPOS_RELATORIO_AGENDAMENTOS) + "\r\n"
+        for lote in iterar_relatorio_agendamentos(self.inicio_iso, self.fim_iso):
+            if self.formato == "csv":
+                saida = io.StringIO()
+                escritor = csv.DictWriter(saida, fieldnames=CAMPOS_RELATORIO_AGENDAMENTOS)
+                escritor.writerows(lote)
+                yield saida.getvalue()
+            else:
+                yield "".join(json.dumps(linha, ensure_ascii=False) + "\n" for linha in lote)
+
+def ler_cursor_agendamentos(valor: str) -> tuple:
+    # Cursor no formato "AAAA-MM-DD,HH:MM,id", devolvido em "proximo" pela página anterior
+    data_iso, horario, agendamento_id = valor.split(",")
+    datetime.strptime(data_iso, "%Y-%m-%d")
+    return data_iso, horario, int(agendamento_id)
+
+# Agendamentos do usuário logado, paginados: ?limite=N&apos=<proximo>&historico=1
+# (sem historico lista só de hoje em diante)
+LIMITE_MAXIMO_PAGINA_AGENDAMENTOS = 50
+
+@app.route("/agendamentos/meus", methods=["GET"])
+def meus_agendamentos():
+    corpo, codigo = listar_meus_agendamentos(request.args, session)
+    return jsonify(corpo), codigo
+
+def listar_meus_agendamentos(parametros, sessao) -> Tuple[dict, int]:
+    usuario_info = sessao.get('usuario')
+    email_usuario = usuario_info.get('email') if isinstance(usuario_info, dict) else usuario_info
+    if not email_usuario:
+        return {"error": "Você precisa estar logado para ver seus agendamentos."}, 401
+
+    limite = parametros.get("limite", "10")
+    if not limite.isdigit() or not 1 <= int(limite) <= LIMITE_MAXIMO_PAGINA_AGENDAMENTOS:
+        return {"error": f"Parâmetro 'limite' deve ser um número entre 1 e {LIMITE_MAXIMO_PAGINA_AGENDAMENTOS}."}, 400
+    apos = None
+    if parametros.get("apos"):
+        try:
+            apos = ler_cursor_agendamentos(parametros["apos"])
+        except ValueError:
+            return {"error": "Parâmetro 'apos' inválido."}, 400
+
+    agendamentos, proxima = listar_agendamentos_usuario(
+        email_usuario, apos=apos, limite=int(limite), incluir_passados=parametros.get("historico") == "1"
+    )
+    return {
+        "quantidade": len(agendamentos),
+        "agendamentos": agendamentos,
+        "proximo": ",".join(str(parte) for parte in proxima) if proxima else None
+    }, 200
+
+def montar_relatorio(parametros, sessao) -> Tuple[dict, int]:
+    if 'usuario' not in sessao or sessao.get('tipo') != 'funcionario':
+        return {"error": "Acesso negado. Apenas funcionários podem gerar relatórios."}, 403
+
+    tipo_relatorio = parametros.get("tipo", "completo")
+    data_inicio_str = parametros.get("data_inicio")
+    data_fim_str = parametros.get("data_fim")
 
     if not data_inicio_str or not data_fim_str:
-        return jsonify({"error": "Datas de início e fim são obrigatórias."}), 400
+        return {"error": "Datas de início e fim são obrigatórias."}, 400
 
     if not chatbot.validarDado('data', data_inicio_str) or not chatbot.validarDado('data', data_fim_str):
-        return jsonify({"error": "Formato de data inválido. Use DD/MM/AAAA."}), 400
+        return {"error": "Formato de data inválido. Use DD/MM/AAAA."}, 400
 
     try:
-        data_inicio = datetime.strptime(data_inicio_str, '%d/%m/%Y').strftime('%d/%m/%Y')
-        data_fim = datetime.strptime(data_fim_str, '%d/%m/%Y').strftime('%d/%m/%Y')
+        data_inicio = normalizar_data(data_inicio_str)
+        data_fim = normalizar_data(data_fim_str)
 
-        if tipo_relatorio == 'estatistico':
-            stats = executar_consulta("""
-                SELECT status, COUNT(*) as quantidade
-                FROM agendamentos
-                WHERE data BETWEEN ? AND ?
-                GROUP BY status
-            """, (data_inicio, data_fim), fetch_all=True)
-
-            servicos = executar_consulta("""
-                SELECT servico, COUNT(*) as quantidade
-                FROM agendamentos
-                WHERE data BETWEEN ? AND ?
-                GROUP BY servico
-                ORDER BY quantidade DESC
-            """, (data_inicio, data_fim), fetch_all=True)
+        # O filtro usa a data ISO indexada; DD/MM/AAAA não ordena corretamente como texto
+        intervalo = (data_para_iso(data_inicio_str), data_para_iso(data_fim_str))
 
-            return jsonify({
+        if tipo_relatorio == 'estatistico':
+            # Somas sobre estatisticas_diarias: o custo cresce com os dias do período, não com os agendamentos
+            def calcular_estatisticas():
+                stats = executar_consulta("""
+                    SELECT nullif(status, '') as status, SUM(quantidade) as quantidade
+                    FROM estatisticas_diarias
+                    WHERE data_iso BETWEEN ? AND ?
+                    GROUP BY status
+                """, intervalo, fetch_all=True)
+
+                servicos = executar_consulta("""
+                    SELECT servico, SUM(quantidade) as quantidade
+                    FROM estatisticas_diarias
+                    WHERE data_iso BETWEEN ? AND ?
+                    GROUP BY servico
+                    ORDER BY quantidade DESC
+                """, intervalo, fetch_all=True)
+
+                if stats is None or servicos is None:
+                    return None
+                return {"stats_status": stats, "stats_servicos": servicos}
+
+            resultado, cache = relatorio_em_cache('estatistico', *intervalo, calcular_estatisticas)
+            resultado = resultado or {"stats_status": None, "stats_servicos": None}
+
+            return {
                 "tipo": "estatistico",
                 "periodo": {"inicio": data_inicio, "fim": data_fim},
-                "stats_status": stats,
-                "stats_servicos": servicos
-            })
+                "stats_status": resultado["stats_status"],
+                "stats_servicos": resultado["stats_servicos"],
+                "cache": cache
+            }, 200
 
         else:
-            campos = """a.id, a.protocolo, u.nome, u.email, u.cpf, u.telefone,
-                        a.servico, a.data, a.horario, a.status, a.observacoes, a.created_at"""
-
-            agendamentos = executar_consulta(f"""
-                SELECT {campos}
-                FROM agendamentos a
-                JOIN usuarios u ON a.usuario_email = u.email
-                WHERE a.data BETWEEN ? AND ?
-                ORDER BY a.data, a.horario
-            """, (data_inicio, data_fim), fetch_all=True)
-
-            return jsonify({
+            formato = parametros.get("formato", "json").lower()
+            if formato in ExportacaoRelatorio.MIMETYPES:
+                return ExportacaoRelatorio(formato, *intervalo), 200
+            if formato != "json":
+                return {"error": "Formato inválido. Use json, ndjson ou csv."}, 400
+
+            # JSON paginado: ?limite=N&apos=<proximo da página anterior>
+            limite = parametros.get("limite", str(LIMITE_PAGINA_RELATORIO))
+            if not limite.isdigit() or not 1 <= int(limite) <= LIMITE_MAXIMO_PAGINA_RELATORIO:
+                return {"error": f"Parâmetro 'limite' deve ser um número entre 1 e {LIMITE_MAXIMO_PAGINA_RELATORIO}."}, 400
+            apos = None
+            if parametros.get("apos"):
+                try:
+                    apos = ler_cursor_agendamentos(parametros["apos"])
+                except ValueError:
+                    return {"error": "Parâmetro 'apos' inválido."}, 400
+
+            agendamentos, proxima = pagina_relatorio_agendamentos(*intervalo, apos=apos, limite=int(limite))
+
+            return {
                 "tipo": "completo",
                 "periodo": {"inicio": data_inicio, "fim": data_fim},
-                "total": len(agendamentos),
-                "agendamentos": agendamentos
-            })
+                "quantidade": len(agendamentos),
+                "agendamentos": agendamentos,
+                "proximo": ",".join(str(parte) for parte in proxima) if proxima else None
+            }, 200
 
     except Exception as e:
         app.logger.error(f"Erro ao gerar relatório: {str(e)}", exc_info=True)
-        return jsonify({"error": "Erro interno ao gerar relatório."}), 500
+        return {"error": "Erro interno ao gerar relatório."}, 500
     
-# Rota de status para verificar se o servidor está funcionando
+# Recarrega intenções e modelo sem reiniciar o servidor. Aceita o cabeçalho X-Admin-Token igual a
+# AGENDEID_TOKEN_ADMIN (scripts de implantação, dispensados do CSRF) ou um funcionário logado, que
+# precisa enviar o token CSRF como em qualquer formulário. Só o worker que atendeu a requisição
+# recarrega; os demais percebem a troca dos arquivos pela verificação de AGENDEID_RECARGA_INTERVALO.
+@app.route("/admin/recarregar", methods=["POST"])
+@limiter.limit("5 per minute")
+@csrf.exempt
+def recarregar_modelo():
+    token_admin = os.environ.get('AGENDEID_TOKEN_ADMIN')
+    token_valido = bool(token_admin) and hmac.compare_digest(
+        request.headers.get('X-Admin-Token', '').encode('utf-8'), token_admin.encode('utf-8')
+    )
+    if not token_valido:
+        if 'usuario' not in session or session.get('tipo') != 'funcionario':
+            return jsonify({"error": "Acesso negado."}), 403
+        # Pela sessão o cookie vai junto em qualquer POST: sem o token CSRF, outra página poderia disparar a recarga
+        csrf.protect()
+
+    # A leitura e validação dos arquivos acontece fora da requisição; a troca é atômica
+    chatbot.recarregarEmSegundoPlano()
+    app.logger.info(f"Recarga do modelo solicitada no worker {os.getpid()}.")
+    return jsonify({"status": "recarregando", "versao_atual": chatbot.artefatos.versao}), 202
+
+# Rota de status: sem parâmetros indica que o processo está vivo (liveness);
+# com ?ready=1 responde 503 até o modelo do chatbot terminar de carregar (readiness)
 @app.route("/status")
 def status():
-    return jsonify({"status": "ok"}), 200
+    pronto = chatbot.pronto.is_set()
+    if request.args.get("ready") and not pronto:
+        return jsonify({"status": "carregando", "pronto": False}), 503
+    return jsonify({
+        "status": "ok",
+        "pronto": pronto,
+        "modelo_carregado": chatbot.modelo is not None,
+        "versao_modelo": chatbot.artefatos.versao,
+        "ultima_recarga": chatbot.ultima_recarga,
+        "cache_classificacao": chatbot.cache_classificacao.estatisticas(),
+        "cache_relatorios": cache_relatorios.estatisticas(),
+        "estados_conversa": chatbot.estados.estatisticas(),
+        "senhas": pool_senhas.estatisticas(),
+        "inferencia": chatbot.agendador.estatisticas() if chatbot.agendador else None
+    }), 200
+
+# Recalcula as estatísticas diárias dos relatórios: flask --app app reconstruir-estatisticas
+@app.cli.command("reconstruir-estatisticas")
+def reconstruir_estatisticas():
+    linhas = reconstruir_estatisticas_diarias()
+    print(f"Estatísticas diárias reconstruídas: {linhas} linhas.")
 
 # Inicia o servidor Flask
 if __name__ == "__main__":
@@ -0,0 +1,188 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import Callable, Dict, List, Tuple
+
+from asgiref.wsgi import WsgiToAsgi
+from limits import parse_many
+
+from app import (
+    app, limiter, chatbot, LIMITES_PADRAO, LIMITE_CHAT, ExportacaoRelatorio,
+    responder_chat, consultar_disponibilidade, montar_relatorio, aplicar_cabecalhos_seguranca
+)
+
+# Modo assíncrono (ASGI): uvicorn asgi:aplicacao --workers 4
+# /chat, /agendamentos/disponiveis e /relatorios são atendidas direto no event loop, que só
+# faz a E/S da conexão; banco, inferência e hash de senha rodam em um pool de threads.
+# Clientes parados não ocupam thread nenhuma. As demais rotas (páginas, login, cadastro...)
+# seguem pelo Flask via WsgiToAsgi, com CSRF e limites como antes. A sessão usa o mesmo
+# cookie assinado do Flask e os limites usam o mesmo armazenamento do flask-limiter.
+# Importar app aplica as migrações: se o banco não puder ser migrado, a importação falha e
+# o uvicorn não sobe o worker.
+
+THREADS_ASGI = int(os.environ.get('AGENDEID_ASGI_THREADS', '32'))
+
+# Corpo máximo aceito nas rotas atendidas aqui
+TAMANHO_MAXIMO_CORPO = 64 * 1024
+
+class AplicacaoASGI:
+    def __init__(self, app_flask):
+        self.app = app_flask
+        self.wsgi = WsgiToAsgi(app_flask)
+        self.executor = ThreadPoolExecutor(THREADS_ASGI, thread_name_prefix="asgi")
+        # (método, caminho) -> (função que recebe a requisição e a sessão, limites da rota)
+        self.rotas: Dict[Tuple[str, str], Tuple[Callable, List]] = {
+            ("POST", "/chat"): (
+                lambda requisicao, sessao: responder_chat(
+                    requisicao.get_json(silent=True) if requisicao.is_json else None, sessao
+                ),
+                parse_many(LIMITE_CHAT)
+            ),
+            ("GET", "/agendamentos/disponiveis"): (
+                lambda requisicao, sessao: consultar_disponibilidade(requisicao.args),
+                [limite for texto in LIMITES_PADRAO for limite in parse_many(texto)]
+            ),
+            ("GET", "/relatorios"): (
+                lambda requisicao, sessao: montar_relatorio(requisicao.args, sessao),
+                [limite for texto in LIMITES_PADRAO for limite in parse_many(texto)]
+            ),
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.ciclo_de_vida(receive, send)
+            return
+        rota = self.rotas.get((scope.get("method"), scope.get("path"))) if scope["type"] == "http" else None
+        if rota is None:
+            await self.wsgi(scope, receive, send)
+            return
+
+        try:
+            corpo = await self.ler_corpo(receive)
+        except ValueError:
+            await self.enviar(send, 413, [(b"content-type", b"application/json")], b'{"error": "Corpo muito grande."}')
+            return
+        if corpo is None:
+            return  # cliente desconectou antes de terminar de enviar
+
+        manipulador, limites = rota
+        loop = asyncio.get_running_loop()
+        resposta, partes = await loop.run_in_executor(self.executor, self.atender, scope, corpo, manipulador, limites)
+        cabecalhos = [(nome.lower().encode("latin-1"), valor.encode("latin-1")) for nome, valor in resposta.headers.items()]
+        if partes is None:
+            await self.enviar(send, resposta.status_code, cabecalhos, resposta.get_data())
+        else:
+            await self.enviar_em_partes(send, resposta.status_code, cabecalhos, partes)
+
+    async def ciclo_de_vida(self, receive, send):
+        while True:
+            mensagem = await receive()
+            if mensagem["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif mensagem["type"] == "lifespan.shutdown":
+                self.executor.shutdown(wait=False)
+                if chatbot.agendador:
+                    chatbot.agendador.encerrar()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def ler_corpo(self, receive):
+        partes = []
+        tamanho = 0
+        while True:
+            mensagem = await receive()
+            if mensagem["type"] == "http.disconnect":
+                return None
+            parte = mensagem.get("body", b"")
+            tamanho += len(parte)
+            if tamanho > TAMANHO_MAXIMO_CORPO:
+                raise ValueError("corpo acima do limite")
+            partes.append(parte)
+            if not mensagem.get("more_body"):
+                return b"".join(partes)
+
+    async def enviar(self, send, status: int, cabecalhos: list, corpo: bytes):
+        await send({"type": "http.response.start", "status": status, "headers": cabecalhos})
+        await send({"type": "http.response.body", "body": corpo})
+
+    async def enviar_em_partes(self, send, status: int, cabecalhos: list, partes):
+        # Cada lote é lido do banco no pool de threads e enviado assim que fica pronto
+        loop = asyncio.get_running_loop()
+        await send({"type": "http.response.start", "status": status, "headers": cabecalhos})
+        try:
+            while True:
+                parte = await loop.run_in_executor(self.executor, next, partes, None)
+                if parte is None:
+                    break
+                await send({"type": "http.response.body", "body": parte.encode("utf-8"), "more_body": True})
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            # Fecha o gerador (e devolve a conexão ao pool) mesmo se o cliente desconectar
+            await loop.run_in_executor(self.executor, partes.close)
+
+    def ambiente_wsgi(self, scope, corpo: bytes) -> dict:
+        # Ambiente mínimo para montar a requisição do werkzeug (cookies, query string, JSON)
+        servidor = scope.get("server") or ("localhost", 80)
+        cliente = scope.get("client") or ("", 0)
+        ambiente = {
+            "REQUEST_METHOD": scope["method"],
+            "SCRIPT_NAME": scope.get("root_path", ""),
+            "PATH_INFO": scope["path"],
+            "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+            "SERVER_NAME": servidor[0],
+            "SERVER_PORT": str(servidor[1]),
+            "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+            "REMOTE_ADDR": cliente[0],
+            "CONTENT_LENGTH": str(len(corpo)),
+            "wsgi.url_scheme": scope.get("scheme", "http"),
+            "wsgi.input": BytesIO(corpo),
+        }
+        for nome, valor in scope.get("headers", []):
+            nome = nome.decode("latin-1").upper().replace("-", "_")
+            valor = valor.decode("latin-1")
+            if nome == "CONTENT_TYPE":
+                ambiente["CONTENT_TYPE"] = valor
+            elif nome != "CONTENT_LENGTH":
+                chave = f"HTTP_{nome}"
+                ambiente[chave] = f"{ambiente[chave]},{valor}" if chave in ambiente else valor
+        return ambiente
+
+    def limite_excedido(self, requisicao, limites: List, caminho: str) -> bool:
+        if not limiter.enabled:
+            return False
+        return not all(
+            limiter.limiter.hit(limite, "asgi", requisicao.remote_addr or "127.0.0.1", caminho)
+            for limite in limites
+        )
+
+    def atender(self, scope, corpo: bytes, manipulador: Callable, limites: List):
+        # Roda no pool de threads: limites, sessão, regra da rota e montagem da resposta
+        requisicao = self.app.request_class(self.ambiente_wsgi(scope, corpo))
+        interface = self.app.session_interface
+
+        if self.limite_excedido(requisicao, limites, scope["path"]):
+            resposta = self.app.response_class(
+                self.app.json.dumps({"error": "Limite de requisições excedido. Tente novamente mais tarde."}),
+                status=429, mimetype="application/json"
+            )
+            return aplicar_cabecalhos_seguranca(resposta, requisicao.headers.get("Origin", "*")), None
+
+        sessao = interface.open_session(self.app, requisicao)
+        if sessao is None:
+            sessao = interface.make_null_session(self.app)
+        corpo_resposta, codigo = manipulador(requisicao, sessao)
+
+        # Exportações são enviadas em partes: aqui só saem status e cabeçalhos
+        partes = None
+        if isinstance(corpo_resposta, ExportacaoRelatorio):
+            resposta = self.app.response_class(status=codigo, mimetype=corpo_resposta.mimetype, headers=corpo_resposta.cabecalhos())
+            resposta.headers.pop("Content-Length", None)
+            partes = corpo_resposta.partes()
+        else:
+            resposta = self.app.response_class(self.app.json.dumps(corpo_resposta), status=codigo, mimetype="application/json")
+        aplicar_cabecalhos_seguranca(resposta, requisicao.headers.get("Origin", "*"))
+        interface.save_session(self.app, sessao, resposta)
+        return resposta, partes
+
+aplicacao = AplicacaoASGI(app)
@@ -0,0 +1,182 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+class CacheTTL:
+    # Cache em memória com tamanho máximo (LRU) e tempo de vida por entrada.
+    # Consultas simultâneas pela mesma chave são agrupadas: só uma calcula o valor.
+    def __init__(self, tamanho_maximo: int = 256, ttl: float = 30.0):
+        self.tamanho_maximo = tamanho_maximo
+        self.ttl = ttl
+        self.acertos = 0
+        self.falhas = 0
+        self._entradas: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._em_calculo: Dict[Hashable, "_Calculo"] = {}
+        self._trava = threading.Lock()
+
+    def obter(self, chave: Hashable) -> Optional[Any]:
+        with self._trava:
+            return self._obter_valido(chave)
+
+    def _obter_valido(self, chave: Hashable) -> Optional[Any]:
+        entrada = self._entradas.get(chave)
+        if entrada is None:
+            return None
+        valor, expira_em = entrada
+        if expira_em < time.monotonic():
+            del self._entradas[chave]
+            return None
+        self._entradas.move_to_end(chave)
+        return valor
+
+    def definir(self, chave: Hashable, valor: Any):
+        with self._trava:
+            self._guardar(chave, valor)
+
+    def _guardar(self, chave: Hashable, valor: Any):
+        self._entradas[chave] = (valor, time.monotonic() + self.ttl)
+        self._entradas.move_to_end(chave)
+        while len(self._entradas) > self.tamanho_maximo:
+            self._entradas.popitem(last=False)
+
+    def obter_ou_calcular(self, chave: Hashable, calcular: Callable[[], Any]) -> Any:
+        with self._trava:
+            valor = self._obter_valido(chave)
+            if valor is not None:
+                self.acertos += 1
+                return valor
+            self.falhas += 1
+            calculo = self._em_calculo.get(chave)
+            responsavel = calculo is None
+            if responsavel:
+                calculo = self._em_calculo[chave] = _Calculo()
+
+        if not responsavel:
+            return calculo.aguardar()
+
+        try:
+            valor = calcular()
+        except BaseException as erro:
+            with self._trava:
+                self._liberar(chave, calculo)
+            calculo.falhar(erro)
+            raise
+
+        with self._trava:
+            self._liberar(chave, calculo)
+            # Se a chave foi invalidada durante o cálculo o valor pode estar desatualizado
+            if not calculo.obsoleto:
+                self._guardar(chave, valor)
+        calculo.concluir(valor)
+        return valor
+
+    def _liberar(self, chave: Hashable, calculo: "_Calculo"):
+        # Uma invalidação pode já ter posto outro cálculo da mesma chave no lugar deste
+        if self._em_calculo.get(chave) is calculo:
+            del self._em_calculo[chave]
+
+    def invalidar(self, chave: Hashable):
+        # Um cálculo em andamento leu dados anteriores à escrita: quem chegar depois
+        # começa um cálculo novo em vez de aguardar por ele, e o resultado antigo não é guardado
+        with self._trava:
+            self._entradas.pop(chave, None)
+            calculo = self._em_calculo.pop(chave, None)
+            if calculo is not None:
+                calculo.obsoleto = True
+
+    def limpar(self):
+        with self._trava:
+            self._entradas.clear()
+            for calculo in self._em_calculo.values():
+                calculo.obsoleto = True
+            self._em_calculo.clear()
+
+    def estatisticas(self) -> Dict[str, Any]:
+        with self._trava:
+            total = self.acertos + self.falhas
+            return {
+                "entradas": len(self._entradas),
+                "acertos": self.acertos,
+                "falhas": self.falhas,
+                "taxa_acerto": round(self.acertos / total, 4) if total else 0.0
+            }
+
+class CacheVersionado:
+    # Cache de resultados que valem enquanto a versão dos dados for a mesma com que foram
+    # calculados: não há TTL, quem consulta informa a versão atual e qualquer escrita nos
+    # dados (que incrementa a versão) torna as entradas antigas inválidas.
+    def __init__(self, tamanho_maximo: int = 128):
+        self.tamanho_maximo = tamanho_maximo
+        self.acertos = 0
+        self.falhas = 0
+        # chave -> (valor, versão, instante do cálculo)
+        self._entradas: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._trava = threading.Lock()
+
+    def obter_ou_calcular(self, chave: Hashable, versao: int, calcular: Callable[[], Any]) -> Tuple[Any, Dict[str, Any]]:
+        # Devolve (valor, metadados); resultados None (erro na consulta) não são guardados
+        agora = time.monotonic()
+        with self._trava:
+            entrada = self._entradas.get(chave)
+            if entrada is not None and entrada[1] == versao:
+                self.acertos += 1
+                self._entradas.move_to_end(chave)
+                return entrada[0], self._metadados(True, versao, agora - entrada[2])
+            self.falhas += 1
+
+        valor = calcular()
+        with self._trava:
+            atual = self._entradas.get(chave)
+            # Não sobrescreve uma entrada já calculada com dados mais novos
+            if valor is not None and (atual is None or atual[1] <= versao):
+                self._entradas[chave] = (valor, versao, agora)
+                self._entradas.move_to_end(chave)
+                while len(self._entradas) > self.tamanho_maximo:
+                    self._entradas.popitem(last=False)
+            return valor, self._metadados(False, versao, 0.0)
+
+    def _metadados(self, acerto: bool, versao: int, idade: float) -> Dict[str, Any]:
+        total = self.acertos + self.falhas
+        return {
+            "acerto": acerto,
+            "idade_segundos": round(idade, 1),
+            "versao_dados": versao,
+            "taxa_acerto": round(self.acertos / total, 4) if total else 0.0
+        }
+
+    def limpar(self):
+        with self._trava:
+            self._entradas.clear()
+
+    def estatisticas(self) -> Dict[str, Any]:
+        with self._trava:
+            total = self.acertos + self.falhas
+            return {
+                "entradas": len(self._entradas),
+                "acertos": self.acertos,
+                "falhas": self.falhas,
+                "taxa_acerto": round(self.acertos / total, 4) if total else 0.0
+            }
+
+class _Calculo:
+    # Resultado de um cálculo em andamento, compartilhado com as consultas que chegaram depois
+    def __init__(self):
+        self.obsoleto = False
+        self._pronto = threading.Event()
+        self._valor = None
+        self._erro = None
+
+    def concluir(self, valor: Any):
+        self._valor = valor
+        self._pronto.set()
+
+    def falhar(self, erro: BaseException):
+        self._erro = erro
+        self._pronto.set()
+
+    def aguardar(self) -> Any:
+        self._pronto.wait()
+        if self._erro is not None:
+            raise self._erro
+        return self._valor
@@ -1,95 +1,262 @@
-import random
 import json
 import os
 import re
 import numpy as np
 from datetime import datetime, date, timedelta
 from typing import Optional, Dict, Any
-from werkzeug.security import generate_password_hash
-import tensorflow as tf
-from tensorflow.keras.models import load_model
-import nltk
-from flask import session
-from nltk.stem import PorterStemmer
-import sqlite3
 import pickle
-
+import threading
+import time
+
+from backend.inferencia import carregar_motor, AgendadorInferencia
+from backend.vetorizador import Vetorizador
+from backend.cache import CacheTTL
+from backend.intencoes import RegistroIntencoes
+from backend.estados import criar_armazenamento_estados
 from backend.database import (
     executar_consulta, validar_cpf, validar_data, validar_email, 
-    obter_horarios_disponiveis, obter_usuario, obter_agendamentos_usuario, 
-    autenticar_usuario, executar_consulta_retorna_id  
+    obter_horarios_disponiveis, obter_usuario, listar_agendamentos_usuario, 
+    autenticar_usuario, normalizar_data, cadastrar_usuario,
+    agendar_servico, alterar_agendamento, atualizar_status_agendamento,
+    HorarioIndisponivelError, proximos_horarios_livres, relatorio_em_cache
 )
 
+# Agendamentos por mensagem na listagem do chat e comandos que pedem a próxima página
+AGENDAMENTOS_POR_PAGINA = int(os.environ.get('AGENDEID_AGENDAMENTOS_POR_PAGINA', '5'))
+COMANDOS_MAIS = ('mais', 'ver mais', 'próximos', 'proximos')
+
+# Arquivos do modelo treinado e das intenções, relativos à pasta do projeto
+CAMINHO_MODELO = 'backend/modelos_salvos/chatbot_model.h5'
+CAMINHO_PESOS = 'backend/modelos_salvos/chatbot_pesos.npz'
+CAMINHO_PALAVRAS = 'backend/modelos_salvos/words.pkl'
+CAMINHO_CLASSES = 'backend/modelos_salvos/classes.pkl'
+CAMINHO_INTENCOES = 'intents.json'
+
+# Palavras-chave usadas quando o modelo não classifica a mensagem. A ordem define a
+# prioridade: vale a primeira entrada encontrada na mensagem.
+PALAVRAS_CHAVE_INTENCOES = {
+    'cadastro': 'cadastro', 'registrar': 'cadastro', 'criar conta': 'cadastro',
+    'login': 'login', 'entrar': 'login', 'acessar': 'login',
+    'agendar': 'agendar', 'marcar': 'agendar', 'horario': 'agendar', 'consulta': 'agendar',
+    'alterar': 'alterar', 'mudar': 'alterar', 'remarcar': 'alterar',
+    'cancelar': 'cancelar', 'desmarcar': 'cancelar',
+    'meus agendamentos': 'consultar', 'ver agendamentos': 'consultar',
+    'documentos': 'documentos', 'papéis': 'documentos', 'necessário': 'documentos',
+    'atendente': 'atendente', 'falar com alguém': 'atendente',
+    'local': 'locais', 'onde': 'locais', 'endereço': 'locais',
+    'sair': 'sair', 'logout': 'sair', 'deslogar': 'sair'
+}
+
+# Respostas contextuais do modo conversação; {nome} é o primeiro nome do usuário
+PALAVRAS_CHAVE_RESPOSTAS = {
+    'obrigado': "Por nada, {nome}! Estou aqui para ajudar.",
+    'tchau': "Até logo, {nome}! Foi um prazer ajudar.",
+    'como vai': "Estou bem, obrigado por perguntar, {nome}!",
+    'tudo bem': "Tudo ótimo aqui, {nome}! E com você?",
+    'bom dia': "Bom dia, {nome}! Como posso ajudar?",
+    'boa tarde': "Boa tarde, {nome}! Em que posso ajudar?",
+    'boa noite': "Boa noite, {nome}! Precisa de algo?"
+}
+
+def compilarRegistro(intencoes: dict) -> RegistroIntencoes:
+    return RegistroIntencoes(intencoes, {
+        'palavra_chave': PALAVRAS_CHAVE_INTENCOES,
+        'resposta': PALAVRAS_CHAVE_RESPOSTAS
+    })
+
+class ArtefatosModelo:
+    # Modelo, vocabulário e classes de uma mesma versão. Um objeto novo é montado e validado
+    # a cada recarga e substitui o anterior em uma única atribuição.
+    __slots__ = ('modelo', 'palavras', 'classes', 'vetorizador', 'agendador', 'versao')
+
+    def __init__(self, modelo=None, palavras=None, classes=None, versao: int = 0):
+        self.modelo = modelo
+        self.palavras = palavras or []
+        self.classes = classes or []
+        self.vetorizador = Vetorizador(self.palavras) if self.palavras else None
+        # AGENDEID_LOTE_MAXIMO=1 desativa o agrupamento
+        self.agendador = AgendadorInferencia(
+            modelo,
+            lote_maximo=int(os.environ.get('AGENDEID_LOTE_MAXIMO', '32')),
+            espera_maxima=float(os.environ.get('AGENDEID_LOTE_ESPERA_MS', '2')) / 1000
+        ) if modelo else None
+        self.versao = versao
+
+    @property
+    def completos(self) -> bool:
+        return bool(self.modelo and self.palavras and self.classes)
+
 class Chatbot:
-    def __init__(self):
+    def __init__(self, carregar_em_segundo_plano: bool = True):
         # Inicializa o chatbot carregando o modelo de IA e as intenções
-        self.modelo = None
-        self.palavras = []
-        self.classes = []
-        self.stemmer = PorterStemmer()  # Para reduzir palavras ao radical
-        self.estados = {}  # Armazena o estado de cada conversa por usuário
+        self.artefatos = ArtefatosModelo()  # Modelo, palavras e classes em uso
+        self.estados = criar_armazenamento_estados()  # Armazena o estado de cada conversa por usuário
         self.intencoes = {}  # Armazena as intenções carregadas do JSON
+        self.registro = compilarRegistro(self.intencoes)  # Respostas por tag e autômato de palavras-chave
+        self.pronto = threading.Event()  # Sinaliza que o modelo terminou de carregar
+        self.assinatura_arquivos = None  # Datas de modificação dos arquivos carregados
+        self.ultima_recarga = None
+        self._trava_recarga = threading.Lock()
+
+        # Classificações já calculadas, indexadas pelo conjunto de radicais conhecidos da mensagem;
+        # é esvaziado sempre que o modelo ou as intenções são recarregados
+        self.cache_classificacao = CacheTTL(
+            tamanho_maximo=int(os.environ.get('AGENDEID_CACHE_CLASSIFICACAO', '2048')),
+            ttl=float('inf')
+        )
 
-        self.carregarModelo()
         self.carregarIntencoes()
 
-    def carregarModelo(self):
-        # Carrega o modelo de IA treinado e os arquivos auxiliares
-        try:
-            modelo_path = 'backend/modelos_salvos/chatbot_model.h5'
-            palavras_path = 'backend/modelos_salvos/words.pkl'
-            classes_path = 'backend/modelos_salvos/classes.pkl'
+        # O modelo é carregado fora da inicialização para o servidor começar a atender
+        # imediatamente; até lá, classificarIntencao usa apenas as palavras-chave
+        if carregar_em_segundo_plano:
+            threading.Thread(target=self.carregarEAquecer, name="carregamento-modelo", daemon=True).start()
+        else:
+            self.carregarEAquecer()
 
-            if os.path.exists(modelo_path):
-                self.modelo = load_model(modelo_path)
-                print("Modelo carregado")
+        # AGENDEID_RECARGA_INTERVALO (segundos) liga a verificação periódica dos arquivos
+        intervalo = float(os.environ.get('AGENDEID_RECARGA_INTERVALO', '0'))
+        if intervalo > 0:
+            threading.Thread(target=self.monitorarArquivos, args=(intervalo,), name="monitor-artefatos", daemon=True).start()
 
-            if os.path.exists(palavras_path):
-                with open(palavras_path, 'rb') as f:
-                    self.palavras = pickle.load(f)
-                print("Lista de palavras carregada")
+    # Atalhos para os artefatos em uso
+    @property
+    def modelo(self):
+        return self.artefatos.modelo
 
-            if os.path.exists(classes_path):
-                with open(classes_path, 'rb') as f:
-                    self.classes = pickle.load(f)
-                print("Lista de classes carregada")
+    @property
+    def palavras(self):
+        return self.artefatos.palavras
 
+    @property
+    def classes(self):
+        return self.artefatos.classes
+
+    @property
+    def agendador(self):
+        return self.artefatos.agendador
+
+    def carregarEAquecer(self):
+        try:
+            with self._trava_recarga:
+                self.assinatura_arquivos = self.assinaturaArquivos()
+                self.carregarModelo()
+        finally:
+            self.pronto.set()
+
+    def lerArtefatos(self) -> ArtefatosModelo:
+        # Lê e valida os arquivos do modelo sem alterar o que está em uso
+        # AGENDEID_MOTOR_INFERENCIA: 'numpy', 'keras' ou 'auto' (padrão)
+        modelo = carregar_motor(CAMINHO_MODELO, CAMINHO_PESOS, os.environ.get('AGENDEID_MOTOR_INFERENCIA', 'auto'))
+        palavras, classes = [], []
+
+        if os.path.exists(CAMINHO_PALAVRAS):
+            with open(CAMINHO_PALAVRAS, 'rb') as f:
+                palavras = pickle.load(f)
+
+        if os.path.exists(CAMINHO_CLASSES):
+            with open(CAMINHO_CLASSES, 'rb') as f:
+                classes = pickle.load(f)
+
+        if modelo:
+            if not palavras or not classes:
+                raise ValueError("Modelo encontrado sem a lista de palavras ou de classes")
+            if modelo.tamanho_entrada != len(palavras):
+                raise ValueError(f"Modelo espera {modelo.tamanho_entrada} palavras, vocabulário tem {len(palavras)}")
+            if modelo.tamanho_saida != len(classes):
+                raise ValueError(f"Modelo produz {modelo.tamanho_saida} classes, lista tem {len(classes)}")
+
+        artefatos = ArtefatosModelo(modelo, palavras, classes, versao=self.artefatos.versao + 1)
+
+        # Primeira predição e tokenização pagam a inicialização antes do primeiro usuário
+        if artefatos.completos:
+            artefatos.modelo.prever(artefatos.vetorizador.vetorizar("aquecimento do tokenizador"))
+        return artefatos
+
+    def carregarModelo(self) -> bool:
+        # Carrega o modelo de IA treinado e os arquivos auxiliares; em caso de erro mantém os atuais
+        try:
+            artefatos = self.lerArtefatos()
         except Exception as e:
             print(f"Erro ao carregar modelo: {e}")
-            self.modelo = None
+            return False
+
+        anteriores, self.artefatos = self.artefatos, artefatos
+        self.cache_classificacao.limpar()
+        # Quem leu os artefatos antigos antes da troca ainda é atendido: o agendador antigo
+        # responde o que já está na fila e, depois de encerrado, prevê na thread de quem chama
+        if anteriores.agendador:
+            anteriores.agendador.encerrar()
+
+        if artefatos.modelo:
+            print(f"Modelo carregado ({type(artefatos.modelo).__name__}, "
+                  f"{len(artefatos.palavras)} palavras, {len(artefatos.classes)} classes)")
+        return True
 
     def carregarIntencoes(self):
         # Carrega as intenções do arquivo JSON
         try:
-            with open('intents.json', encoding='utf-8') as arquivo:
-                self.intencoes = json.load(arquivo)
+            with open(CAMINHO_INTENCOES, encoding='utf-8') as arquivo:
+                intencoes = json.load(arquivo)
+            for intent in intencoes['intents']:
+                if not intent.get('tag') or not isinstance(intent.get('patterns', []), list):
+                    raise ValueError(f"Intenção inválida: {intent}")
+            self.registro = compilarRegistro(intencoes)
+            self.intencoes = intencoes
+            self.cache_classificacao.limpar()
             return True
         except Exception as e:
             print(f"Erro ao carregar intenções: {e}")
             return False
 
+    def assinaturaArquivos(self) -> tuple:
+        # Data de modificação e tamanho de cada arquivo monitorado
+        assinatura = []
+        for caminho in (CAMINHO_MODELO, CAMINHO_PESOS, CAMINHO_PALAVRAS, CAMINHO_CLASSES, CAMINHO_INTENCOES):
+            try:
+                info = os.stat(caminho)
+                assinatura.append((caminho, info.st_mtime_ns, info.st_size))
+            except OSError:
+                assinatura.append((caminho, None, None))
+        return tuple(assinatura)
+
+    def recarregar(self) -> Dict[str, bool]:
+        # Recarrega intenções e modelo; chamadas simultâneas são executadas uma de cada vez
+        with self._trava_recarga:
+            self.assinatura_arquivos = self.assinaturaArquivos()
+            resultado = {"intencoes": self.carregarIntencoes(), "modelo": self.carregarModelo()}
+            self.ultima_recarga = datetime.now().isoformat(timespec='seconds')
+            print(f"Recarga concluída: {resultado}")
+            return resultado
+
+    def recarregarEmSegundoPlano(self):
+        threading.Thread(target=self.recarregar, name="recarga-artefatos", daemon=True).start()
+
+    def monitorarArquivos(self, intervalo: float):
+        # Recarrega automaticamente quando algum arquivo do modelo ou das intenções muda
+        while True:
+            time.sleep(intervalo)
+            try:
+                if self.pronto.is_set() and self.assinaturaArquivos() != self.assinatura_arquivos:
+                    self.recarregar()
+            except Exception as e:
+                print(f"Erro ao monitorar arquivos do modelo: {e}")
+
     def classificarMensagem(self, mensagem: str) -> Optional[str]:
         # Classifica a intenção da mensagem usando o modelo de IA
-        if not self.modelo or not self.palavras or not self.classes:
+        artefatos = self.artefatos  # Uma única leitura: a recarga pode trocar os artefatos a qualquer momento
+        if not self.pronto.is_set() or not artefatos.completos:
             return None
 
         try:
-            # Pré-processa a mensagem
-            tokens = nltk.word_tokenize(mensagem.lower())
-            tokens = [self.stemmer.stem(p) for p in tokens]
-
-            # Cria vetor de características
-            bag = [1 if palavra in tokens else 0 for palavra in self.palavras]
-            entrada = np.array([bag])
-
-            # Faz a predição
-            resultado = self.modelo.predict(entrada, verbose=0)
-            indice = np.argmax(resultado)
-            confianca = resultado[0][indice]
+            # Mensagens com os mesmos radicais conhecidos geram a mesma entrada e a mesma predição
+            indices = artefatos.vetorizador.indices_de(mensagem)
+            intencao, confianca = self.cache_classificacao.obter_ou_calcular(
+                (artefatos.versao, tuple(indices)), lambda: self.preverIntencao(artefatos, mensagem, indices)
+            )
 
             # Retorna a intenção se a confiança for alta
             if confianca > 0.7:
-                intencao = self.classes[indice]
                 print(f"Classificado: '{mensagem}' -> {intencao} (confiança: {confianca:.2f})")
                 return intencao
                 
@@ -98,6 +265,13 @@ class Chatbot:
 
         return None
 
+    def preverIntencao(self, artefatos: ArtefatosModelo, mensagem: str, indices: list) -> tuple:
+        # Executa o modelo e devolve (intenção mais provável, confiança)
+        entrada = artefatos.vetorizador.vetorizar(mensagem, indices)
+        resultado = artefatos.agendador.prever(entrada[0])
+        indice = int(np.argmax(resultado))
+        return artefatos.classes[indice], float(resultado[indice])
+
     def conversarLivre(self, mensagem: str, email: str) -> dict:
         # Modo de conversação livre com o chatbot
         try:
@@ -167,20 +341,9 @@ class Chatbot:
         nome = usuario['nome'].split()[0]
         
         # Respostas contextuais baseadas em palavras-chave
-        respostas = {
-            'obrigado': f"Por nada, {nome}! Estou aqui para ajudar.",
-            'tchau': f"Até logo, {nome}! Foi um prazer ajudar.",
-            'como vai': f"Estou bem, obrigado por perguntar, {nome}!",
-            'tudo bem': f"Tudo ótimo aqui, {nome}! E com você?",
-            'bom dia': f"Bom dia, {nome}! Como posso ajudar?",
-            'boa tarde': f"Boa tarde, {nome}! Em que posso ajudar?",
-            'boa noite': f"Boa noite, {nome}! Precisa de algo?"
-        }
-        
-        # Verifica palavras-chave na mensagem
-        for palavra, resposta in respostas.items():
-            if palavra in mensagem:
-                return resposta
+        resposta = self.registro.analisar(mensagem).get('resposta')
+        if resposta:
+            return resposta.format(nome=nome)
         
         # Resposta genérica
         return f"""Interessante pergunta, {nome}!
@@ -197,39 +360,24 @@ Digite 'menu' para opções ou faça sua pergunta."""
     def classificarIntencao(self, mensagem: str) -> str:
         # Classifica a intenção por palavras-chave se a IA falhar
         mensagem = mensagem.lower().strip()
+        analise = self.registro.analisar(mensagem)
+
+        # Mensagem idêntica a um padrão do intents.json dispensa o modelo
+        if 'exato' in analise:
+            return analise['exato']
         
         # Tenta classificar com IA primeiro
         intencao = self.classificarMensagem(mensagem)
         if intencao:
             return intencao
-        
-        # Mapeamento de palavras-chave para intenções
-        keywords = {
-            'cadastro': ['cadastro', 'registrar', 'criar conta'],
-            'login': ['login', 'entrar', 'acessar'],
-            'agendar': ['agendar', 'marcar', 'horario', 'consulta'],
-            'alterar': ['alterar', 'mudar', 'remarcar'],
-            'cancelar': ['cancelar', 'desmarcar'],
-            'consultar': ['meus agendamentos', 'ver agendamentos'],
-            'documentos': ['documentos', 'papéis', 'necessário'],
-            'atendente': ['atendente', 'falar com alguém'],
-            'locais': ['local', 'onde', 'endereço'],
-            'sair': ['sair', 'logout', 'deslogar']
-        }
 
-        # Procura por palavras-chave
-        for intencao, palavras in keywords.items():
-            if any(p in mensagem for p in palavras):
-                return intencao
-
-        return 'desconhecido'
+        return analise.get('palavra_chave', 'desconhecido')
 
     def obterResposta(self, tag: str) -> str:
         # Obtém uma resposta padrão para uma intenção específica
-        if tag in self.intencoes:
-            respostas = self.intencoes[tag].get('responses', [])
-            if respostas:
-                return random.choice(respostas)
+        resposta = self.registro.resposta(tag)
+        if resposta:
+            return resposta
         
         # Respostas padrão para cada tipo de intenção
         respostasPadrao = {
@@ -273,11 +421,9 @@ Digite 'menu' para opções ou faça sua pergunta."""
     def obterRespostaPorTag(self, tag: str) -> str:
         # Obtém uma resposta aleatória para uma tag específica das intenções
         try:
-            for intent in self.intencoes['intents']:
-                if intent['tag'] == tag:
-                    respostas = intent.get('responses', [])
-                    if respostas:
-                        return random.choice(respostas)
+            resposta = self.registro.resposta(tag)
+            if resposta:
+                return resposta
             return "Desculpe, não encontrei uma resposta para isso."
         except Exception as e:
             print(f"Erro ao buscar resposta para tag '{tag}': {e}")
@@ -337,14 +483,14 @@ Digite 'menu' para opções ou faça sua pergunta."""
                 if dataAgendamento <= date.today():
                     return "Data deve ser futura. Digite uma nova data:"
                     
-                estado["dados"]["novaData"] = mensagem.strip()
+                estado["dados"]["novaData"] = normalizar_data(mensagem)
                 estado["etapa"] = "novoHorario"
-                horarios = obter_horarios_disponiveis(mensagem.strip())
+                horarios = obter_horarios_disponiveis(estado["dados"]["novaData"])
                 
                 if not horarios:
                     return "Nenhum horário disponível nesta data. Escolha outra data:"
                     
-                return f"Horários disponíveis para {mensagem.strip()}:\n{', '.join(horarios)}\n\nEscolha um horário:"
+                return f"Horários disponíveis para {estado['dados']['novaData']}:\n{', '.join(horarios)}\n\nEscolha um horário:"
                 
             except ValueError:
                 return "Data inválida. Use o formato DD/MM/AAAA:"
@@ -375,14 +521,15 @@ Digite SIM para confirmar ou NÃO para cancelar:"""
             if mensagem.strip().lower() == "sim":
                 try:
                     # Atualiza o agendamento no banco
-
-                    executar_consulta(
-                        "UPDATE agendamentos SET data = ?, horario = ?, status = 'Agendado' WHERE id = ?",
-                        (estado["dados"]["novaData"], estado["dados"]["novoHorario"], 
-                         estado["dados"]["agendamentoId"])
+                    alterar_agendamento(
+                        estado["dados"]["agendamentoId"], estado["dados"]["novaData"],
+                        estado["dados"]["novoHorario"], email
                     )
                     del self.estados[email]
                     return f"Agendamento alterado com sucesso!\nNova data: {estado['dados']['novaData']} às {estado['dados']['novoHorario']}"
+                except HorarioIndisponivelError:
+                    estado["etapa"] = "novoHorario"
+                    return "Esse horário acabou de ser reservado por outra pessoa. Escolha outro horário:"
                 except Exception as e:
                     return "Erro ao alterar agendamento. Tente novamente."
             else:
@@ -457,9 +604,9 @@ Digite SIM para confirmar ou NÃO para cancelar:"""
                 if dataAgendamento <= date.today():
                     return "Data deve ser futura:"
                 
-                estado["dados"]["data"] = mensagem.strip()
+                estado["dados"]["data"] = normalizar_data(mensagem)
                 estado["etapa"] = "horario"
-                horarios = obter_horarios_disponiveis(mensagem.strip())
+                horarios = obter_horarios_disponiveis(estado["dados"]["data"])
                 
                 if not horarios:
                     return "Nenhum horário disponível. Escolha outra data:"
@@ -487,14 +634,17 @@ Digite SIM para confirmar ou NÃO para cancelar:"""
             if mensagem.strip().lower() == "sim":
                 try:
                     # Cria o agendamento no banco
-                    agendamentoId = executar_consulta(
-                        "INSERT INTO agendamentos (usuario_email, servico, data, horario) VALUES (?, ?, ?, ?)",
-                        (email, estado["dados"]["servico"], estado["dados"]["data"], estado["dados"]["horario"]),
-                        fetch_id=True
+                    import uuid
+                    agendamentoId = agendar_servico(
+                        email, estado["dados"]["servico"], estado["dados"]["data"],
+                        estado["dados"]["horario"], str(uuid.uuid4())[:8].upper()
                     )
                     del self.estados[email]
                     return f"Agendamento realizado!\nProtocolo: CIN-{agendamentoId:06d}"
-                    
+
+                except HorarioIndisponivelError:
+                    estado["etapa"] = "horario"
+                    return "Esse horário acabou de ser reservado por outra pessoa. Escolha outro horário:"
                 except Exception as e:
                     print(f"Erro no agendamento: {e}")
                     return "Erro ao realizar agendamento. Tente novamente."
@@ -503,6 +653,13 @@ Digite SIM para confirmar ou NÃO para cancelar:"""
                 return "Agendamento cancelado."
 
     def processar_mensagem(self, mensagem: str, email_usuario: Optional[str] = None) -> dict:
+        # Com um armazenamento compartilhado, o estado alterado é gravado ao fim de cada mensagem
+        try:
+            return self.responderMensagem(mensagem, email_usuario)
+        finally:
+            self.estados.persistir(email_usuario)
+
+    def responderMensagem(self, mensagem: str, email_usuario: Optional[str] = None) -> dict:
         try:
             msg_limpa = mensagem.lower().strip()
 
@@ -618,10 +775,9 @@ Digite SIM para confirmar ou NÃO para cancelar:"""
 
             elif etapa_atual == 'cadastro_senha':
                 if len(mensagem) >= 6:
-                    estado_atual_usuario['senha'] = mensagem
-
+                    # A senha vai direto para o hash e não fica guardada no estado da conversa
                     campos_obrigatorios = ['nome', 'sexo', 'nacionalidade', 'data_nascimento', 
-                                        'nome_mae', 'cpf', 'email', 'senha', 'tipo_usuario']
+                                        'nome_mae', 'cpf', 'email', 'tipo_usuario']
                     dados_completos = all(campo in estado_atual_usuario for campo in campos_obrigatorios)
 
                     if not dados_completos:
@@ -629,21 +785,16 @@ Digite SIM para confirmar ou NÃO para cancelar:"""
                         return {"resposta": "Dados incompletos. Por favor, comece o cadastro novamente."}
 
                     try:
-                        executar_consulta(
-                            """INSERT INTO usuarios (nome, sexo, nacionalidade, data_nascimento, nome_mae, cpf, email, senha, tipo)
-                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-                            (
-                                estado_atual_usuario['nome'],
-                                estado_atual_usuario['sexo'],
-                                estado_atual_usuario['nacionalidade'],
-                                estado_atual_usuario['data_nascimento'],
-                                estado_atual_usuario['nome_mae'],
-                                estado_atual_usuario['cpf'],
-                                estado_atual_usuario['email'],
-                                generate_password_hash(estado_atual_usuario['senha']),
-                                estado_atual_usuario['tipo_usuario']
-                            ),
-                            commit=True
+                        cadastrar_usuario(
+                            nome=estado_atual_usuario['nome'],
+                            sexo=estado_atual_usuario['sexo'],
+                            nacionalidade=estado_atual_usuario['nacionalidade'],
+                            data_nascimento=estado_atual_usuario['data_nascimento'],
+                            nome_mae=estado_atual_usuario['nome_mae'],
+                            cpf=estado_atual_usuario['cpf'],
+                            email=estado_atual_usuario['email'],
+                            senha=mensagem,
+                            tipo=estado_atual_usuario['tipo_usuario']
                         )
 
                         del self.estados[email_usuario]
@@ -653,10 +804,11 @@ Digite SIM para confirmar ou NÃO para cancelar:"""
                             "redirect": "/"
                         }
 
-                    except sqlite3.IntegrityError as e:
-                        if "UNIQUE constraint failed: usuarios.email" in str(e):
+                    except ValueError as e:
+                        # cadastrar_usuario informa CPF ou e-mail já cadastrados
+                        if "Email" in str(e):
                             return {"resposta": "Este e-mail já está cadastrado. Por favor, use outro."}
-                        elif "UNIQUE constraint failed: usuarios.cpf" in str(e):
+                        elif "CPF" in str(e):
                             return {"resposta": "Este CPF já está cadastrado. Por favor, verifique os dados."}
                         else:
                             print(f"Erro de integridade no cadastro: {e}")
@@ -688,12 +840,13 @@ Digite SIM para confirmar ou NÃO para cancelar:"""
 
                 usuario_autenticado = autenticar_usuario(email_login, senha_login)
                 if usuario_autenticado:
-                    session["usuario"] = {
+                    # Quem chama (app.py ou asgi.py) grava estes dados na sessão do navegador;
+                    # hash da senha e documentos não saem na resposta
+                    usuario_sessao = {
                         "email": usuario_autenticado["email"],
                         "nome": usuario_autenticado["nome"],
                         "tipo": usuario_autenticado["tipo"]
                     }
-                    session["tipo"] = usuario_autenticado["tipo"]
 
                     tipo_usuario_logado = usuario_autenticado["tipo"]
                     del self.estados[email_usuario]
@@ -703,7 +856,7 @@ Digite SIM para confirmar ou NÃO para cancelar:"""
                             "resposta": "Login realizado com sucesso! Bem-vindo(a) ao painel do cliente!",
                             "redirect": "/painel_cliente",
                             "login": True,
-                            "usuario": usuario_autenticado,
+                            "usuario": usuario_sessao,
                             "parametros": {"senha": "preenchido"}
                         }
                     elif tipo_usuario_logado == 'funcionario':
@@ -711,7 +864,7 @@ Digite SIM para confirmar ou NÃO para cancelar:"""
                             "resposta": "Login realizado com sucesso! Bem-vindo(a) ao painel do funcionário!",
                             "redirect": "/painel_funcionario",
                             "login": True,
-                            "usuario": usuario_autenticado,
+                            "usuario": usuario_sessao,
                             "parametros": {"senha": "preenchido"}
                         }
                 else:
@@ -726,7 +879,7 @@ Digite SIM para confirmar ou NÃO para cancelar:"""
 
             elif etapa_atual == 'agendamento_data':
                 if validar_data(msg_limpa):
-                    data_agendamento = msg_limpa
+                    data_agendamento = normalizar_data(msg_limpa)
                     horarios_disponiveis = obter_horarios_disponiveis(data_agendamento)
                     if horarios_disponiveis:
                         estado_atual_usuario['data_agendamento'] = data_agendamento
@@ -736,7 +889,7 @@ Digite SIM para confirmar ou NÃO para cancelar:"""
                             "resposta": f"Horários disponíveis para {data_agendamento}: {', '.join(horarios_disponiveis)}. Qual horário você escolhe?"
                         }
                     else:
-                        return {"resposta": f"Não há horários disponíveis para {data_agendamento}. Tente outra data."}
+                        return {"resposta": self.sugerirAlternativas(data_agendamento)}
                 else:
                     return {"resposta": "Formato de data inválido. Por favor, use DD/MM/AAAA."}
 
@@ -751,11 +904,9 @@ Digite SIM para confirmar ou NÃO para cancelar:"""
                         import uuid
                         protocolo = str(uuid.uuid4())[:8].upper()
 
-                        novo_agendamento_id = executar_consulta_retorna_id(
-                            """INSERT INTO agendamentos 
-                            (usuario_email, servico, data, horario, status, protocolo, data_criacao)
-                            VALUES (?, ?, ?, ?, ?, ?, datetime('now', 'localtime'))""",
-                            (usuario_email_agendamento, servico, data, horario_escolhido, 'Agendado', protocolo)
+                        # INSERT atômico: falha se outro usuário reservou o horário nesse meio-tempo
+                        novo_agendamento_id = agendar_servico(
+                            usuario_email_agendamento, servico, data, horario_escolhido, protocolo
                         )
 
                         if novo_agendamento_id:
@@ -765,6 +916,13 @@ Digite SIM para confirmar ou NÃO para cancelar:"""
                             }
                         else:
                             return {"resposta": "Erro ao finalizar agendamento. Por favor, tente novamente."}
+                    except HorarioIndisponivelError:
+                        horarios_disponiveis = obter_horarios_disponiveis(data)
+                        if not horarios_disponiveis:
+                            estado_atual_usuario['etapa'] = 'agendamento_data'
+                            return {"resposta": f"O horário {horario_escolhido} acabou de ser reservado e não há mais horários em {data}. Escolha outra data (DD/MM/AAAA):"}
+                        estado_atual_usuario['horarios_disponiveis'] = horarios_disponiveis
+                        return {"resposta": f"O horário {horario_escolhido} acabou de ser reservado por outra pessoa. Horários disponíveis para {data}: {', '.join(horarios_disponiveis)}. Qual horário você escolhe?"}
                     except Exception as e:
                         print(f"Erro ao criar agendamento: {e}")
                         del self.estados[email_usuario]
@@ -786,10 +944,7 @@ Digite SIM para confirmar ou NÃO para cancelar:"""
                     if agendamento['status'] == 'Cancelado':
                         return {"resposta": "Esse agendamento já está cancelado."}
                     
-                    executar_consulta(
-                        "UPDATE agendamentos SET status = 'Cancelado' WHERE id = ? AND usuario_email = ?",
-                        (agendamento_id, email_usuario), commit=True
-                    )
+                    atualizar_status_agendamento(agendamento_id, 'Cancelado', email_usuario)
                     del self.estados[email_usuario]
                     return {"resposta": "Agendamento cancelado com sucesso!"}
 
@@ -833,14 +988,15 @@ Digite SIM para confirmar ou NÃO para cancelar:"""
 
             elif etapa_atual == 'alterar_agendamento_nova_data':
                 if validar_data(msg_limpa):
-                    horarios = obter_horarios_disponiveis(msg_limpa)
+                    nova_data = normalizar_data(msg_limpa)
+                    horarios = obter_horarios_disponiveis(nova_data)
                     if horarios:
-                        estado_atual_usuario['nova_data'] = msg_limpa
+                        estado_atual_usuario['nova_data'] = nova_data
                         estado_atual_usuario['horarios_nova_data'] = horarios
                         estado_atual_usuario['etapa'] = 'alterar_agendamento_novo_horario_nova_data'
-                        return {"resposta": f"Horários disponíveis para {msg_limpa}: {', '.join(horarios)}. Escolha um:"}
+                        return {"resposta": f"Horários disponíveis para {nova_data}: {', '.join(horarios)}. Escolha um:"}
                     else:
-                        return {"resposta": f"Não há horários disponíveis para {msg_limpa}. Tente outra data."}
+                        return {"resposta": f"Não há horários disponíveis para {nova_data}. Tente outra data."}
                 else:
                     return {"resposta": "Formato de data inválido. Por favor, use DD/MM/AAAA."}
 
@@ -858,12 +1014,15 @@ Digite SIM para confirmar ou NÃO para cancelar:"""
 
                 if msg_limpa in horarios_disponiveis:
                     try:
-                        executar_consulta(
-                            "UPDATE agendamentos SET data = ?, horario = ? WHERE id = ?",
-                            (nova_data, msg_limpa, agendamento['id']), commit=True
-                        )
+                        alterar_agendamento(agendamento['id'], nova_data, msg_limpa, email_usuario)
                         del self.estados[email_usuario]
                         return {"resposta": f"Agendamento alterado com sucesso!\nNova data: {nova_data}\nNovo horário: {msg_limpa}"}
+                    except HorarioIndisponivelError:
+                        horarios = obter_horarios_disponiveis(nova_data)
+                        estado_atual_usuario['horarios_nova_data'] = horarios
+                        estado_atual_usuario['nova_data'] = nova_data
+                        estado_atual_usuario['etapa'] = 'alterar_agendamento_novo_horario_nova_data'
+                        return {"resposta": f"O horário {msg_limpa} acabou de ser reservado por outra pessoa. Horários disponíveis para {nova_data}: {', '.join(horarios)}. Escolha um:"}
                     except Exception as e:
                         print(f"Erro ao alterar agendamento: {e}")
                         del self.estados[email_usuario]
@@ -878,10 +1037,10 @@ Digite SIM para confirmar ou NÃO para cancelar:"""
                     return {"resposta": self.processarAgendaFuncionario(email_usuario)}
                 elif msg_limpa == '2':
                     del self.estados[email_usuario]
-                    return {"resposta": self.gerarRelatorioComparecimento()}
+                    return self.gerarRelatorioComparecimento()
                 elif msg_limpa == '3':
                     del self.estados[email_usuario]
-                    return {"resposta": self.gerarRelatorioComparecimento()}
+                    return self.gerarRelatorioServicos()
                 elif msg_limpa == 'sair':
                     del self.estados[email_usuario]
                     return {"resposta": "Operação cancelada."}
@@ -894,11 +1053,20 @@ Digite SIM para confirmar ou NÃO para cancelar:"""
                     return {"resposta": "Opção inválida. Digite 1, 2, 3 ou 'sair'."}
 
             # ESTADOS FINAIS - CLASSIFICAÇÃO DE INTENÇÃO 
+            # Continuação da listagem de agendamentos; qualquer outra mensagem encerra a listagem
+            apos = estado_atual_usuario.pop('agendamentos_apos', None)
+            if apos and msg_limpa in COMANDOS_MAIS:
+                return self.listarAgendamentos(email_usuario, tuple(apos))
+
             # Se chegou até aqui, não está em nenhum estado específico, então classifica a intenção
             intencao = self.classificarIntencao(msg_limpa)
 
+            # Perfil consultado uma única vez por mensagem (ids temporários não são usuários)
+            usuario_logado = None
+            if email_usuario and not email_usuario.startswith('temp_'):
+                usuario_logado = obter_usuario(email_usuario)
+
             # Verificar se é funcionário e processar comandos específicos
-            usuario_logado = obter_usuario(email_usuario) if email_usuario else None
             if usuario_logado and usuario_logado['tipo'] == 'funcionario':
                 if intencao == "agenda_funcionario" or msg_limpa in ['ver agenda', 'agenda']:
                     resposta = self.processarAgendaFuncionario(email_usuario)
@@ -939,9 +1107,8 @@ Digite SIM para confirmar ou NÃO para cancelar:"""
             # Lógica para tratamento de intenções gerais
             if intencao == "saudacao":
                 nome_usuario = ""
-                if email_usuario and obter_usuario(email_usuario):
-                    user_data = obter_usuario(email_usuario)
-                    nome_usuario = user_data['nome'].split(' ')[0]
+                if usuario_logado:
+                    nome_usuario = usuario_logado['nome'].split(' ')[0]
                 return {"resposta": f"Olá{', ' + nome_usuario if nome_usuario else ''}! Como posso ajudar?\n\nOpções disponíveis:\n• Cadastro\n• Login\n• Agendamento\n• Meus agendamentos\n• Alterar agendamento\n• Documentos necessários"}
 
             elif intencao == "cadastro_inicio":
@@ -953,7 +1120,7 @@ Digite SIM para confirmar ou NÃO para cancelar:"""
                 return {"resposta": "Para fazer login, qual o seu e-mail?"}
 
             elif intencao == "iniciar_agendamento":
-                if not email_usuario or not obter_usuario(email_usuario):
+                if not usuario_logado:
                     return {"resposta": "Você precisa estar logado para fazer agendamentos. Por favor, digite 'login' ou 'cadastro'."}
                 
                 self.estados[email_usuario] = {"etapa": "agendamento_servico"}
@@ -963,33 +1130,16 @@ Digite SIM para confirmar ou NÃO para cancelar:"""
             elif intencao == "meus_agendamentos":
                 if not email_usuario:
                     return {"resposta": "Você precisa estar logado para ver seus agendamentos."}
-
-                agendamentos = obter_agendamentos_usuario(email_usuario)
-
-                if agendamentos:
-                    lista_agendamentos = " Seus agendamentos:\n\n"
-                    for ag in agendamentos:
-                        lista_agendamentos += (
-                            f"ID: {ag['id']}\n"
-                            f"Protocolo: {ag.get('protocolo', 'N/A')}\n"
-                            f"Serviço: {ag['servico']}\n"
-                            f"Data: {ag['data']}\n"
-                            f"Hora: {ag['horario']}\n"
-                            f"Status: {ag['status']}\n"
-                            f"{'─' * 30}\n"
-                        )
-                    return {"resposta": lista_agendamentos}
-                else:
-                    return {"resposta": "Você não possui agendamentos. Deseja 'agendar' um serviço?"}
+                return self.listarAgendamentos(email_usuario)
 
             elif intencao == "cancelar_agendamento":
-                if not email_usuario or not obter_usuario(email_usuario):
+                if not usuario_logado:
                     return {"resposta": "Você precisa estar logado para cancelar agendamentos."}
                 self.estados[email_usuario]['etapa'] = 'cancelar_agendamento_id'
                 return {"resposta": "Para cancelar um agendamento, por favor, digite o ID do agendamento:"}
 
             elif intencao == "alterar_agendamento":
-                if not email_usuario or not obter_usuario(email_usuario):
+                if not usuario_logado:
                     return {"resposta": "Você precisa estar logado para alterar agendamentos."}
                 self.estados[email_usuario]['etapa'] = 'alterar_agendamento_id'
                 return {"resposta": "Para alterar um agendamento, por favor, digite o ID do agendamento que deseja modificar:"}
@@ -1012,12 +1162,10 @@ Digite SIM para confirmar ou NÃO para cancelar:"""
                     "redirect": "/"  
                 }
 
-            # Intenção desconhecida
-            for intent in self.intencoes.get("intents", []):
-                            if intent["tag"] == intencao:
-                                respostas = intent.get("responses", [])
-                                if respostas:
-                                    return {"resposta": random.choice(respostas)}
+            # Intenção sem fluxo próprio: responde com o texto do intents.json
+            resposta = self.registro.resposta(intencao)
+            if resposta:
+                return {"resposta": resposta}
 
             # Intenção desconhecida
             return {"resposta": self.obterRespostaPorTag("desconhecido")}
@@ -1026,6 +1174,40 @@ Digite SIM para confirmar ou NÃO para cancelar:"""
             print(f"ERRO no processar_mensagem: {str(e)}")
             return {"resposta": "Ocorreu um erro ao processar sua mensagem"}
 
+    def listarAgendamentos(self, email_usuario: str, apos: Optional[tuple] = None) -> dict:
+        # Uma página dos próximos agendamentos; a chave da última linha fica no estado para o 'mais'
+        agendamentos, proxima = listar_agendamentos_usuario(email_usuario, apos=apos, limite=AGENDAMENTOS_POR_PAGINA)
+
+        if not agendamentos:
+            if apos:
+                return {"resposta": "Não há mais agendamentos."}
+            return {"resposta": "Você não possui agendamentos futuros. Deseja 'agendar' um serviço?"}
+
+        lista_agendamentos = " Seus agendamentos:\n\n" if not apos else ""
+        for ag in agendamentos:
+            lista_agendamentos += (
+                f"ID: {ag['id']}\n"
+                f"Protocolo: {ag.get('protocolo', 'N/A')}\n"
+                f"Serviço: {ag['servico']}\n"
+                f"Data: {ag['data']}\n"
+                f"Hora: {ag['horario']}\n"
+                f"Status: {ag['status']}\n"
+                f"{'─' * 30}\n"
+            )
+        if proxima:
+            self.estados[email_usuario]['agendamentos_apos'] = list(proxima)
+            lista_agendamentos += "Digite 'mais' para ver os próximos."
+        return {"resposta": lista_agendamentos}
+
+    def sugerirAlternativas(self, data: str) -> str:
+        # Sugere os próximos horários livres após uma data sem vagas
+        dia_seguinte = (datetime.strptime(data, '%d/%m/%Y') + timedelta(days=1)).strftime('%d/%m/%Y')
+        livres = proximos_horarios_livres(dia_seguinte, 5)
+        if not livres:
+            return f"Não há horários disponíveis para {data}. Tente outra data."
+        sugestoes = "\n".join(f"• {item['data']} às {item['horario']}" for item in livres)
+        return f"Não há horários disponíveis para {data}. Próximos horários livres:\n{sugestoes}\n\nDigite outra data (DD/MM/AAAA):"
+
     def processarAgendaFuncionario(self, emailFuncionario: str) -> str:
         try:
             hoje = date.today().strftime('%d/%m/%Y')
@@ -1091,10 +1273,7 @@ Digite SIM para confirmar ou NÃO para cancelar:"""
             if not agendamento:
                 return f"Nenhum agendamento pendente de presença para '{identificador}' hoje ({hoje})."
 
-            executar_consulta(
-                "UPDATE agendamentos SET status = 'Presente' WHERE id = ?",
-                (agendamento['id'],), commit=True
-            )
+            atualizar_status_agendamento(agendamento['id'], 'Presente')
 
             return (
                 f"✅ Presença confirmada com sucesso!\n"
@@ -1104,6 +1283,8 @@ Digite SIM para confirmar ou NÃO para cancelar:"""
                 f"ID Agendamento: {agendamento['id']}"
             )
 
+        except HorarioIndisponivelError:
+            return f"O horário do agendamento {agendamento['id']} já foi ocupado por outra reserva. Presença não confirmada."
         except Exception as e:
             print(f"Erro ao confirmar presença: {e}")
             return "Erro ao confirmar presença. Tente novamente."
@@ -1127,53 +1308,60 @@ Digite SIM para confirmar ou NÃO para cancelar:"""
             print(f"Erro ao buscar cliente: {e}")
             return None
 
-    def gerarRelatorioComparecimento(self) -> str:
+    # Relatórios dos últimos 30 dias (e agendamentos futuros) pelo cache de relatórios;
+    # devolvem a resposta do chat com os metadados do cache
+    def periodoRelatorio(self) -> tuple:
+        return (date.today() - timedelta(days=30)).isoformat(), date.max.isoformat()
+
+    def gerarRelatorioComparecimento(self) -> dict:
         try:
-            relatorio = executar_consulta(
+            periodo = self.periodoRelatorio()
+            relatorio, cache = relatorio_em_cache('comparecimento', *periodo, lambda: executar_consulta(
                 """SELECT 
-                    COUNT(*) as total,
-                    SUM(CASE WHEN status = 'Presente' THEN 1 ELSE 0 END) as presentes,
-                    SUM(CASE WHEN status = 'Faltou' OR status = 'Cancelado' THEN 1 ELSE 0 END) as ausencias
-                FROM agendamentos 
-                WHERE date(substr(data, 7, 4) || '-' || substr(data, 4, 2) || '-' || substr(data, 1, 2)) 
-                    >= date('now', '-30 days')""",
+                    COALESCE(SUM(quantidade), 0) as total,
+                    COALESCE(SUM(CASE WHEN status = 'Presente' THEN quantidade ELSE 0 END), 0) as presentes,
+                    COALESCE(SUM(CASE WHEN status = 'Faltou' OR status = 'Cancelado' THEN quantidade ELSE 0 END), 0) as ausencias
+                FROM estatisticas_diarias 
+                WHERE data_iso BETWEEN ? AND ?""",
+                periodo,
                 fetchOne=True
-            )
+            ))
             
             if relatorio and relatorio['total'] > 0:
                 taxaComparecimento = (relatorio['presentes'] / relatorio['total']) * 100
-                return (
+                return {"resposta": (
                     f"RELATÓRIO DE COMPARECIMENTO (Últimos 30 dias)\n\n"
                     f"Total de agendamentos: {relatorio['total']}\n"
                     f"Presentes confirmados: {relatorio['presentes']}\n"
                     f"Ausências: {relatorio['ausencias']}\n"
                     f"Taxa de comparecimento: {taxaComparecimento:.1f}%\n"
-                )
-            return "Nenhum dado de comparecimento nos últimos 30 dias."
+                ), "cache": cache}
+            return {"resposta": "Nenhum dado de comparecimento nos últimos 30 dias.", "cache": cache}
         except Exception as e:
             print(f"Erro ao gerar relatório: {e}")
-            return "Erro ao gerar relatório. Tente novamente."
+            return {"resposta": "Erro ao gerar relatório. Tente novamente."}
 
-    def gerarRelatorioServicos(self) -> str:
+    def gerarRelatorioServicos(self) -> dict:
         try:
-            servicos = executar_consulta(
-                """SELECT servico, COUNT(*) as quantidade
-                FROM agendamentos 
-                WHERE date(substr(data, 7, 4) || '-' || substr(data, 4, 2) || '-' || substr(data, 1, 2)) 
-                    >= date('now', '-30 days')
+            periodo = self.periodoRelatorio()
+            servicos, cache = relatorio_em_cache('servicos', *periodo, lambda: executar_consulta(
+                """SELECT servico, SUM(quantidade) as quantidade
+                FROM estatisticas_diarias 
+                WHERE data_iso BETWEEN ? AND ?
                 GROUP BY servico 
                 ORDER BY quantidade DESC 
                 LIMIT 10""",
+                periodo,
                 fetchAll=True
-            )
+            ))
             
             if servicos:
                 relatorio = ["SERVIÇOS MAIS DEMANDADOS (Últimos 30 dias)\n"]
                 for i, servico in enumerate(servicos, 1):
                     medalha = "🥇" if i == 1 else "🥈" if i == 2 else "🥉" if i == 3 else f"{i}."
                     relatorio.append(f"{medalha} {servico['servico']}: {servico['quantidade']}")
-                return "\n".join(relatorio)
-            return "Nenhum serviço agendado nos últimos 30 dias."
+                return {"resposta": "\n".join(relatorio), "cache": cache}
+            return {"resposta": "Nenhum serviço agendado nos últimos 30 dias.", "cache": cache}
         except Exception as e:
             print(f"Erro ao gerar relatório: {e}")
-            return "Erro ao gerar relatório. Tente novamente."
\ No newline at end of file
+            return {"resposta": "Erro ao gerar relatório. Tente novamente."}
\ No newline at end of file
@@ -4,11 +4,13 @@ import random
 import numpy as np
 import nltk
 import pickle
-from nltk.stem import PorterStemmer
 from tensorflow.keras.models import Sequential
 from tensorflow.keras.layers import Dense, Dropout
 from tensorflow.keras.optimizers.legacy import SGD
 
+from inferencia import MotorNumPy, exportar_pesos
+from vetorizador import Vetorizador, tokenizar
+
 # Verifica e baixa o tokenizador da NLTK caso necessário
 try:
     nltk.data.find('tokenizers/punkt')
@@ -21,10 +23,9 @@ CAMINHO_INTENCOES = os.path.join(CAMINHO_BASE, "..", "intents.json")
 CAMINHO_MODELO = os.path.join(CAMINHO_BASE, "modelos_salvos", "chatbot_model.h5")
 CAMINHO_PALAVRAS = os.path.join(CAMINHO_BASE, "modelos_salvos", "words.pkl")
 CAMINHO_CLASSES = os.path.join(CAMINHO_BASE, "modelos_salvos", "classes.pkl")
+CAMINHO_PESOS = os.path.join(CAMINHO_BASE, "modelos_salvos", "chatbot_pesos.npz")
 
 def treinar_modelo():
-    raiz = PorterStemmer()
-
     # Carrega o arquivo de intenções
     with open(CAMINHO_INTENCOES, encoding="utf-8") as arquivo:
         intencoes = json.load(arquivo)
@@ -34,41 +35,29 @@ def treinar_modelo():
     documentos = []
     ignorar = ['?', '!', '.', ',']
 
-    # Processa cada padrão de cada intenção
+    # Processa cada padrão de cada intenção com o mesmo tokenizador usado pelo servidor
     for item in intencoes['intents']:
         for padrao in item['patterns']:
-            tokens = nltk.word_tokenize(padrao)
-            palavras.extend(tokens)
-            documentos.append((tokens, item['tag']))
+            palavras.extend(tokenizar(padrao))
+            documentos.append((padrao, item['tag']))
             if item['tag'] not in classes:
                 classes.append(item['tag'])
 
-    # Aplica stem nas palavras e remove duplicadas
-    palavras = [raiz.stem(p.lower()) for p in palavras if p not in ignorar]
-    palavras = sorted(list(set(palavras)))
+    # Remove pontuação e palavras duplicadas
+    palavras = sorted(set(p for p in palavras if p not in ignorar))
     classes = sorted(list(set(classes)))
 
     print(f"Documentos: {len(documentos)}")
     print(f"Classes: {len(classes)} -> {classes}")
     print(f"Palavras únicas: {len(palavras)} -> {palavras[:10]}...")
 
-    treino = []
-    saida_vazia = [0] * len(classes)
-
     # Converte cada entrada em vetores de características
-    for doc in documentos:
-        saco = []
-        palavras_padrao = [raiz.stem(p.lower()) for p in doc[0]]
-        saco = [1 if palavra in palavras_padrao else 0 for palavra in palavras]
-        linha_saida = list(saida_vazia)
-        linha_saida[classes.index(doc[1])] = 1
-        treino.append([saco, linha_saida])
-
-    random.shuffle(treino)
-    treino = np.array(treino, dtype=object)
-
-    x = np.array(list(treino[:, 0]))
-    y = np.array(list(treino[:, 1]))
+    random.shuffle(documentos)
+    vetorizador = Vetorizador(palavras)
+    x = vetorizador.vetorizar_lote([padrao for padrao, _ in documentos])
+    y = np.zeros((len(documentos), len(classes)), dtype=np.float32)
+    for linha, (_, tag) in enumerate(documentos):
+        y[linha, classes.index(tag)] = 1
 
     # Define a arquitetura da rede neural
     modelo = Sequential()
@@ -90,6 +79,14 @@ def treinar_modelo():
     modelo.save(CAMINHO_MODELO)
     pickle.dump(palavras, open(CAMINHO_PALAVRAS, 'wb'))
     pickle.dump(classes, open(CAMINHO_CLASSES, 'wb'))
+
+    # Exporta os pesos para o motor NumPy usado pelo servidor e confere as saídas
+    exportar_pesos(modelo, CAMINHO_PESOS)
+    np.testing.assert_allclose(
+        MotorNumPy.carregar(CAMINHO_PESOS).prever(x),
+        modelo.predict(x, verbose=0),
+        atol=1e-5
+    )
     print("Modelo e arquivos salvos!")
 
 if __name__ == "__main__":
@@ -1,75 +1,163 @@
 import sqlite3
 import re
-from datetime import datetime
+import os
+import queue
+import threading
+from datetime import datetime, timedelta
 from contextlib import contextmanager
-from typing import Any, Optional, Union, List, Dict
-from werkzeug.security import check_password_hash, generate_password_hash
+from typing import Any, Callable, Optional, Union, List, Dict, Tuple
+from backend.cache import CacheTTL, CacheVersionado
+from backend.migracoes import aplicar_migracoes, restaurar_gatilhos
+from backend.senhas import gerar_hash_senha, verificar_senha, novo_hash_se_desatualizado
 
 # Caminho do banco de dados
-BANCO_DADOS = 'banco.db'
+BANCO_DADOS = os.environ.get('AGENDEID_BANCO', 'banco.db')
+
+# Quantidade máxima de conexões ociosas mantidas por processo
+TAMANHO_POOL = int(os.environ.get('AGENDEID_POOL_CONEXOES', '8'))
+
+# Instruções preparadas reaproveitadas por conexão
+INSTRUCOES_EM_CACHE = 256
+
+# Horários de atendimento oferecidos em cada dia
+HORARIOS_ATENDIMENTO = tuple(f"{h:02d}:00" for h in range(8, 17))
+
+# Maior período (em dias) aceito nas consultas de disponibilidade por intervalo
+JANELA_MAXIMA_DIAS = int(os.environ.get('AGENDEID_JANELA_DISPONIBILIDADE', '62'))
+
+# Cache de disponibilidade por data; as escritas deste módulo invalidam a data afetada
+# e o TTL limita por quanto tempo outro worker pode enxergar um horário já ocupado
+cache_disponibilidade = CacheTTL(
+    tamanho_maximo=int(os.environ.get('AGENDEID_CACHE_DISPONIBILIDADE_TAMANHO', '512')),
+    ttl=float(os.environ.get('AGENDEID_CACHE_DISPONIBILIDADE_TTL', '30'))
+)
+
+# Perfis de usuário por e-mail. O cadastro e as alterações de perfil invalidam a entrada;
+# o TTL curto limita por quanto tempo uma alteração feita em outro worker fica invisível
+cache_usuarios = CacheTTL(
+    tamanho_maximo=int(os.environ.get('AGENDEID_CACHE_USUARIOS_TAMANHO', '1024')),
+    ttl=float(os.environ.get('AGENDEID_CACHE_USUARIOS_TTL', '10'))
+)
+
+# Relatórios por tipo e período, válidos enquanto a versão dos agendamentos não mudar
+cache_relatorios = CacheVersionado(
+    tamanho_maximo=int(os.environ.get('AGENDEID_CACHE_RELATORIOS_TAMANHO', '128'))
+)
+
+# Perfil de armazenamento aplicado uma única vez, na abertura de cada conexão
+PRAGMAS_CONEXAO = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -16000",
+    "PRAGMA mmap_size = 134217728",
+)
+
+class PoolConexoes:
+    # Mantém conexões abertas e já configuradas para serem reutilizadas entre requisições
+    def __init__(self, caminho: str, tamanho: int = TAMANHO_POOL):
+        self.caminho = caminho
+        self.pid = os.getpid()
+        self._ociosas = queue.LifoQueue(maxsize=tamanho)
+
+    def _abrir(self) -> sqlite3.Connection:
+        conexao = sqlite3.connect(
+            self.caminho,
+            timeout=5,
+            check_same_thread=False,
+            cached_statements=INSTRUCOES_EM_CACHE
+        )
+        conexao.row_factory = sqlite3.Row
+        for pragma in PRAGMAS_CONEXAO:
+            conexao.execute(pragma)
+        return conexao
+
+    def adquirir(self) -> sqlite3.Connection:
+        try:
+            return self._ociosas.get_nowait()
+        except queue.Empty:
+            return self._abrir()
+
+    def devolver(self, conexao: sqlite3.Connection):
+        # Transações esquecidas abertas são descartadas, como acontecia ao fechar a conexão
+        if conexao.in_transaction:
+            conexao.rollback()
+        try:
+            self._ociosas.put_nowait(conexao)
+        except queue.Full:
+            conexao.close()
+
+    def fechar(self):
+        while True:
+            try:
+                self._ociosas.get_nowait().close()
+            except queue.Empty:
+                break
+
+_pools: Dict[str, PoolConexoes] = {}
+_trava_pools = threading.Lock()
+
+def _obter_pool() -> PoolConexoes:
+    pool = _pools.get(BANCO_DADOS)
+    # Após um fork cada worker precisa de conexões próprias
+    if pool is None or pool.pid != os.getpid():
+        with _trava_pools:
+            pool = _pools.get(BANCO_DADOS)
+            if pool is None or pool.pid != os.getpid():
+                pool = _pools[BANCO_DADOS] = PoolConexoes(BANCO_DADOS)
+    return pool
+
+def fechar_conexoes():
+    # Fecha todas as conexões ociosas (encerramento do processo ou troca de banco)
+    with _trava_pools:
+        for pool in _pools.values():
+            pool.fechar()
+        _pools.clear()
+
+# Conflito de reserva: o horário já possui um agendamento ativo
+class HorarioIndisponivelError(ValueError):
+    pass
+
+def _conflito_de_horario(erro: sqlite3.IntegrityError) -> bool:
+    mensagem = str(erro)
+    return "idx_agendamentos_vaga_ativa" in mensagem or "agendamentos.data, agendamentos.horario" in mensagem
 
 # Gerenciador de conexão com o banco de dados
 @contextmanager
 def obter_conexao():
-    conexao = None
+    pool = _obter_pool()
+    conexao = pool.adquirir()
     try:
-        conexao = sqlite3.connect(BANCO_DADOS)
-        conexao.row_factory = sqlite3.Row
-        conexao.execute("PRAGMA foreign_keys = ON")
         yield conexao
     except sqlite3.Error as erro:
         print(f"Erro no banco: {erro}")
-        if conexao:
-            conexao.rollback()
+        conexao.rollback()
+        raise
+    except Exception:
+        conexao.rollback()
         raise
     finally:
-        if conexao:
-            conexao.close()
+        pool.devolver(conexao)
 
 # Criação das tabelas do banco de dados
 
 def criar_banco() -> bool:
     try:
         with obter_conexao() as conexao:
-            cursor = conexao.cursor()
-
-            # Tabela de usuários
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS usuarios (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    nome TEXT NOT NULL,
-                    sexo TEXT NOT NULL,
-                    nacionalidade TEXT NOT NULL,
-                    data_nascimento TEXT NOT NULL,
-                    nome_mae TEXT NOT NULL,
-                    cpf TEXT UNIQUE NOT NULL,
-                    email TEXT UNIQUE NOT NULL,
-                    senha TEXT NOT NULL,
-                    telefone TEXT,
-                    tipo TEXT DEFAULT 'cliente',
-                    ativo BOOLEAN DEFAULT 1,
-                    data_cadastro DATETIME DEFAULT CURRENT_TIMESTAMP
-                );
-            """)
-
-            # Tabela de agendamentos
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS agendamentos (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    usuario_email TEXT NOT NULL,
-                    servico TEXT NOT NULL,
-                    data TEXT NOT NULL,
-                    horario TEXT NOT NULL,
-                    status TEXT DEFAULT 'Agendado',
-                    protocolo TEXT UNIQUE,
-                    observacoes TEXT,
-                    data_criacao DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (usuario_email) REFERENCES usuarios(email) ON DELETE CASCADE
-                );
-            """)
-
-            conexao.commit()
-            return True
+            aplicadas = aplicar_migracoes(conexao)
+            if aplicadas:
+                print(f"Migrações aplicadas: {', '.join(str(v) for v in aplicadas)}")
+            restaurados = restaurar_gatilhos(conexao)
+            if restaurados:
+                # Escritas feitas sem os gatilhos não entraram nas estatísticas nem na versão dos dados
+                print(f"Gatilhos restaurados: {', '.join(restaurados)}")
+                conexao.execute("UPDATE versao_dados SET versao = versao + 1 WHERE tabela = 'agendamentos'")
+                conexao.commit()
+        if restaurados:
+            reconstruir_estatisticas_diarias()
+        return True
     except sqlite3.Error as erro:
         print(f"Erro ao criar banco: {erro}")
         return False
@@ -77,47 +165,70 @@ def criar_banco() -> bool:
 def autenticar_usuario(email: str, senha: str) -> Optional[Dict[str, Any]]:
     with obter_conexao() as conexao:
         usuario = conexao.execute("SELECT * FROM usuarios WHERE email = ?", (email,)).fetchone()
-        if usuario and check_password_hash(usuario['senha'], senha):
-            return dict(usuario)
-    return None
+    if not usuario or not verificar_senha(usuario['senha'], senha):
+        return None
+
+    usuario = dict(usuario)
+    # Senhas gravadas com um custo antigo são atualizadas no primeiro login bem-sucedido
+    novo_hash = novo_hash_se_desatualizado(usuario['senha'], senha)
+    if novo_hash:
+        with obter_conexao() as conexao:
+            conexao.execute("UPDATE usuarios SET senha = ? WHERE id = ? AND senha = ?", (novo_hash, usuario['id'], usuario['senha']))
+            conexao.commit()
+        invalidar_usuario(email)
+        usuario['senha'] = novo_hash
+    return usuario
 
 # Obter dados do usuário
 
 def obter_usuario(email: str) -> Optional[Dict[str, Any]]:
+    # E-mails não cadastrados não ficam em cache: o cadastro aparece na hora
+    usuario = cache_usuarios.obter_ou_calcular(email, lambda: _consultar_usuario(email))
+    return dict(usuario) if usuario else None
+
+def _consultar_usuario(email: str) -> Optional[Dict[str, Any]]:
     with obter_conexao() as conexao:
         usuario = conexao.execute("SELECT * FROM usuarios WHERE email = ?", (email,)).fetchone()
         return dict(usuario) if usuario else None
 
+def invalidar_usuario(email: str):
+    # Deve ser chamada por qualquer escrita na linha do usuário
+    cache_usuarios.invalidar(email)
+
 # Executar consulta genérica
 
 def executar_consulta(query, params=None, fetch_one=False, fetch_all=False, fetchAll=False, fetchOne=False, commit=True):
     fetch_one = fetch_one or fetchOne
     fetch_all = fetch_all or fetchAll
 
-    conn = sqlite3.connect("banco.db")
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
     try:
-        if params:
-            cursor.execute(query, params)
-        else:
-            cursor.execute(query)
+        with obter_conexao() as conexao:
+            cursor = conexao.execute(query, params) if params else conexao.execute(query)
 
-        if commit:
-            conn.commit()
+            if commit:
+                conexao.commit()
 
-        if query.strip().lower().startswith("select"):
-            if fetch_one:
-                resultado = cursor.fetchone()
-                return dict(resultado) if resultado else None
-            elif fetch_all:
-                return [dict(linha) for linha in cursor.fetchall()]
-        return True
+            if query.strip().lower().startswith("select"):
+                if fetch_one:
+                    resultado = cursor.fetchone()
+                    return dict(resultado) if resultado else None
+                elif fetch_all:
+                    return [dict(linha) for linha in cursor.fetchall()]
+            return True
     except Exception as e:
         print(f"Erro ao executar consulta: {e}")
         return None
-    finally:
-        conn.close()
+
+# Versão atual dos agendamentos (incrementada por gatilhos a cada escrita)
+
+def versao_agendamentos() -> int:
+    with obter_conexao() as conexao:
+        return conexao.execute("SELECT versao FROM versao_dados WHERE tabela = 'agendamentos'").fetchone()[0]
+
+# Resultado de um relatório pelo cache: devolve (valor, metadados do cache)
+
+def relatorio_em_cache(tipo: str, inicio_iso: str, fim_iso: str, calcular: Callable[[], Any]) -> Tuple[Any, Dict[str, Any]]:
+    return cache_relatorios.obter_ou_calcular((tipo, inicio_iso, fim_iso), versao_agendamentos(), calcular)
 
 # Executar consulta e retornar ID inserido
 
@@ -135,47 +246,206 @@ def executar_consulta_retorna_id(query: str, parametros: tuple = ()) -> Optional
 # Obter horários disponíveis para agendamento
 
 def obter_horarios_disponiveis(data_str: str) -> List[str]:
-    data_obj = datetime.strptime(data_str, '%d/%m/%Y').date()
-    horarios_totais = [f"{h:02d}:00" for h in range(8, 17)]
+    data = normalizar_data(data_str)
+    return list(cache_disponibilidade.obter_ou_calcular(data, lambda: _consultar_horarios_disponiveis(data)))
 
+def _consultar_horarios_disponiveis(data: str) -> tuple:
     with obter_conexao() as conexao:
         resultados = conexao.execute(
             """
             SELECT horario FROM agendamentos
             WHERE data = ? AND status IN ('Agendado', 'Presente', 'Atendido')
             """,
-            (data_obj.strftime('%d/%m/%Y'),)
+            (data,)
         ).fetchall()
 
-        horarios_ocupados = [linha['horario'] for linha in resultados]
-        return [hora for hora in horarios_totais if hora not in horarios_ocupados]
+    horarios_ocupados = {linha['horario'] for linha in resultados}
+    return tuple(hora for hora in HORARIOS_ATENDIMENTO if hora not in horarios_ocupados)
 
-# Obter agendamentos do usuário
+# Disponibilidade de vários dias em uma única consulta agrupada. Cada dia é representado
+# por uma máscara de bits sobre HORARIOS_ATENDIMENTO (bit ligado = horário livre).
 
-def obter_agendamentos_usuario(email: str) -> List[Dict[str, Any]]:
+def _mascara_livres(ocupados: Optional[str]) -> int:
+    mascara = (1 << len(HORARIOS_ATENDIMENTO)) - 1
+    for horario in (ocupados or '').split(','):
+        if horario in HORARIOS_ATENDIMENTO:
+            mascara &= ~(1 << HORARIOS_ATENDIMENTO.index(horario))
+    return mascara
+
+def _horarios_da_mascara(mascara: int) -> List[str]:
+    return [hora for i, hora in enumerate(HORARIOS_ATENDIMENTO) if mascara >> i & 1]
+
+def _mascaras_periodo(inicio, fim) -> Dict[str, int]:
     with obter_conexao() as conexao:
         resultados = conexao.execute(
             """
-            SELECT id, servico, data, horario, status, protocolo
-            FROM agendamentos WHERE usuario_email = ?
-            ORDER BY data, horario
+            SELECT data_iso, group_concat(horario) AS ocupados FROM agendamentos
+            WHERE data_iso BETWEEN ? AND ? AND status IN ('Agendado', 'Presente', 'Atendido')
+            GROUP BY data_iso
             """,
-            (email,)
+            (inicio.isoformat(), fim.isoformat())
+        ).fetchall()
+    return {linha['data_iso']: _mascara_livres(linha['ocupados']) for linha in resultados}
+
+def obter_disponibilidade_periodo(inicio_str: str, fim_str: str) -> List[Dict[str, Any]]:
+    inicio = datetime.strptime(inicio_str.strip(), '%d/%m/%Y').date()
+    fim = datetime.strptime(fim_str.strip(), '%d/%m/%Y').date()
+    if fim < inicio:
+        raise ValueError("A data final deve ser igual ou posterior à inicial.")
+    if (fim - inicio).days >= JANELA_MAXIMA_DIAS:
+        raise ValueError(f"O período deve ter no máximo {JANELA_MAXIMA_DIAS} dias.")
+
+    todos_livres = (1 << len(HORARIOS_ATENDIMENTO)) - 1
+    mascaras = _mascaras_periodo(inicio, fim)
+
+    periodo = []
+    dia = inicio
+    while dia <= fim:
+        horarios = _horarios_da_mascara(mascaras.get(dia.isoformat(), todos_livres))
+        periodo.append({"data": dia.strftime('%d/%m/%Y'), "horarios_disponiveis": horarios})
+        dia += timedelta(days=1)
+    return periodo
+
+# Próximos horários livres a partir de uma data (inclusive), percorrendo até JANELA_MAXIMA_DIAS
+
+def proximos_horarios_livres(data_str: str, quantidade: int = 5) -> List[Dict[str, str]]:
+    inicio = datetime.strptime(data_str.strip(), '%d/%m/%Y').date()
+    limite = inicio + timedelta(days=JANELA_MAXIMA_DIAS - 1)
+    todos_livres = (1 << len(HORARIOS_ATENDIMENTO)) - 1
+
+    livres = []
+    bloco_inicio = inicio
+    while bloco_inicio <= limite and len(livres) < quantidade:
+        # Blocos de uma semana: normalmente o primeiro já basta
+        bloco_fim = min(bloco_inicio + timedelta(days=6), limite)
+        mascaras = _mascaras_periodo(bloco_inicio, bloco_fim)
+        dia = bloco_inicio
+        while dia <= bloco_fim and len(livres) < quantidade:
+            for hora in _horarios_da_mascara(mascaras.get(dia.isoformat(), todos_livres)):
+                livres.append({"data": dia.strftime('%d/%m/%Y'), "horario": hora})
+                if len(livres) == quantidade:
+                    break
+            dia += timedelta(days=1)
+        bloco_inicio = bloco_fim + timedelta(days=1)
+    return livres
+
+def invalidar_disponibilidade(*datas: str):
+    for data in datas:
+        if data:
+            cache_disponibilidade.invalidar(data)
+
+# Agendamentos do usuário
+
+SQL_AGENDAMENTOS_USUARIO = """
+    SELECT id, servico, data, horario, status, protocolo, data_iso
+    FROM agendamentos
+    WHERE usuario_email = ? AND data_iso >= ? {filtro}
+    ORDER BY data_iso, horario, id
+    LIMIT ?
+"""
+CAMPOS_AGENDAMENTO_USUARIO = ('id', 'servico', 'data', 'horario', 'status', 'protocolo')
+
+# Página dos agendamentos de um usuário em ordem cronológica, pelo índice (usuario_email, data_iso, horario).
+# Por padrão só de hoje em diante; apos = (data_iso, horario, id) do último item da página anterior.
+# Devolve (agendamentos, chave do último item ou None quando não há mais páginas)
+
+def listar_agendamentos_usuario(email: str, apos: Optional[tuple] = None, limite: int = 10, incluir_passados: bool = False) -> tuple:
+    desde_iso = "" if incluir_passados else datetime.now().strftime('%Y-%m-%d')
+    filtro = "AND (data_iso, horario, id) > (?, ?, ?)" if apos else ""
+    if apos:
+        desde_iso = max(desde_iso, apos[0])
+    with obter_conexao() as conexao:
+        linhas = conexao.execute(
+            SQL_AGENDAMENTOS_USUARIO.format(filtro=filtro),
+            (email, desde_iso, *(apos or ()), limite + 1)
         ).fetchall()
-        return [dict(linha) for linha in resultados]
+
+    proxima = None
+    if len(linhas) > limite:
+        linhas = linhas[:limite]
+        ultima = linhas[-1]
+        proxima = (ultima['data_iso'], ultima['horario'], ultima['id'])
+    return [{campo: linha[campo] for campo in CAMPOS_AGENDAMENTO_USUARIO} for linha in linhas], proxima
+
+# Recalcula estatisticas_diarias a partir de agendamentos (os gatilhos mantêm a tabela
+# em dia; isto só é necessário após cargas feitas com os gatilhos desligados ou para conferência)
+
+def reconstruir_estatisticas_diarias() -> int:
+    with obter_conexao() as conexao:
+        conexao.execute("BEGIN IMMEDIATE")
+        conexao.execute("DELETE FROM estatisticas_diarias")
+        conexao.execute("""
+            INSERT INTO estatisticas_diarias (data_iso, status, servico, quantidade)
+            SELECT data_iso, coalesce(status, ''), servico, COUNT(*) FROM agendamentos
+            GROUP BY data_iso, coalesce(status, ''), servico
+        """)
+        linhas = conexao.execute("SELECT COUNT(*) FROM estatisticas_diarias").fetchone()[0]
+        conexao.commit()
+    return linhas
+
+# Relatório completo de agendamentos de um período, na ordem (data_iso, horario, id)
+
+SQL_RELATORIO_AGENDAMENTOS = """
+    SELECT a.id, a.protocolo, u.nome, u.email, u.cpf, u.telefone,
+           a.servico, a.data, a.horario, a.status, a.observacoes, a.data_criacao, a.data_iso
+    FROM agendamentos a
+    JOIN usuarios u ON a.usuario_email = u.email
+    WHERE a.data_iso BETWEEN ? AND ? {filtro}
+    ORDER BY a.data_iso, a.horario, a.id
+"""
+
+# Colunas entregues ao cliente (data_iso só serve de chave de ordenação)
+CAMPOS_RELATORIO_AGENDAMENTOS = (
+    'id', 'protocolo', 'nome', 'email', 'cpf', 'telefone',
+    'servico', 'data', 'horario', 'status', 'observacoes', 'data_criacao'
+)
+
+def pagina_relatorio_agendamentos(inicio_iso: str, fim_iso: str, apos: Optional[tuple] = None, limite: int = 500) -> tuple:
+    # Paginação por chave: apos = (data_iso, horario, id) da última linha da página anterior.
+    # Devolve (linhas, chave da última linha ou None quando não há mais páginas)
+    filtro = "AND (a.data_iso, a.horario, a.id) > (?, ?, ?)" if apos else ""
+    if apos:
+        # A busca no índice já começa no dia da última linha entregue
+        inicio_iso = max(inicio_iso, apos[0])
+    parametros = (inicio_iso, fim_iso, *(apos or ()), limite + 1)
+    with obter_conexao() as conexao:
+        linhas = conexao.execute(SQL_RELATORIO_AGENDAMENTOS.format(filtro=filtro) + " LIMIT ?", parametros).fetchall()
+
+    proxima = None
+    if len(linhas) > limite:
+        linhas = linhas[:limite]
+        ultima = linhas[-1]
+        proxima = (ultima['data_iso'], ultima['horario'], ultima['id'])
+    return [{campo: linha[campo] for campo in CAMPOS_RELATORIO_AGENDAMENTOS} for linha in linhas], proxima
+
+def iterar_relatorio_agendamentos(inicio_iso: str, fim_iso: str, lote: int = 500):
+    # Gera lotes de linhas direto do cursor; a memória usada não depende do tamanho do período.
+    # A conexão fica reservada até o gerador terminar ou ser fechado.
+    with obter_conexao() as conexao:
+        cursor = conexao.execute(SQL_RELATORIO_AGENDAMENTOS.format(filtro=""), (inicio_iso, fim_iso))
+        while True:
+            linhas = cursor.fetchmany(lote)
+            if not linhas:
+                return
+            yield [{campo: linha[campo] for campo in CAMPOS_RELATORIO_AGENDAMENTOS} for linha in linhas]
 
 # Cadastro de novo usuário
 
-def cadastrar_usuario(nome: str, sexo: str, nacionalidade: str, data_nascimento: str, nome_mae: str, cpf: str, email: str, senha: str, telefone: Optional[str] = None, tipo: str = 'cliente') -> Optional[int]:
-    senha_criptografada = generate_password_hash(senha)
+def cadastrar_usuario(nome: str, sexo: str, nacionalidade: str, data_nascimento: str, nome_mae: str, cpf: str, email: str, senha: str, telefone: Optional[str] = None, tipo: str = 'cliente') -> int:
+    senha_criptografada = gerar_hash_senha(senha)
     try:
-        return executar_consulta_retorna_id(
-            """
-            INSERT INTO usuarios (nome, sexo, nacionalidade, data_nascimento, nome_mae, cpf, email, senha, telefone, tipo)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            (nome, sexo, nacionalidade, data_nascimento, nome_mae, cpf, email, senha_criptografada, telefone, tipo)
-        )
+        # Conexão direta para que CPF ou e-mail duplicados cheguem como IntegrityError
+        with obter_conexao() as conexao:
+            cursor = conexao.execute(
+                """
+                INSERT INTO usuarios (nome, sexo, nacionalidade, data_nascimento, nome_mae, cpf, email, senha, telefone, tipo)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (nome, sexo, nacionalidade, data_nascimento, nome_mae, cpf, email, senha_criptografada, telefone, tipo)
+            )
+            conexao.commit()
+        invalidar_usuario(email)
+        return cursor.lastrowid
     except sqlite3.IntegrityError as e:
         if "cpf" in str(e):
             raise ValueError("CPF já cadastrado.")
@@ -187,16 +457,26 @@ def cadastrar_usuario(nome: str, sexo: str, nacionalidade: str, data_nascimento:
 # Agendar serviço para o usuário
 
 def agendar_servico(email_usuario: str, servico: str, data: str, horario: str, protocolo: str, observacoes: Optional[str] = None) -> Optional[int]:
+    # A reserva é um único INSERT: o índice idx_agendamentos_vaga_ativa rejeita horários já ocupados
+    data = normalizar_data(data)
     try:
-        return executar_consulta_retorna_id(
-            """
-            INSERT INTO agendamentos (usuario_email, servico, data, horario, protocolo, observacoes)
-            VALUES (?, ?, ?, ?, ?, ?)
-            """,
-            (email_usuario, servico, data, horario, protocolo, observacoes)
-        )
+        with obter_conexao() as conexao:
+            cursor = conexao.execute(
+                """
+                INSERT INTO agendamentos (usuario_email, servico, data, horario, protocolo, observacoes)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                (email_usuario, servico, data, horario, protocolo, observacoes)
+            )
+            conexao.commit()
+            invalidar_disponibilidade(data)
+            return cursor.lastrowid
     except sqlite3.IntegrityError as e:
-        if "protocolo" in str(e):
+        if _conflito_de_horario(e):
+            # A disponibilidade em cache estava desatualizada
+            invalidar_disponibilidade(data)
+            raise HorarioIndisponivelError("Horário já reservado.")
+        elif "protocolo" in str(e):
             raise ValueError("Protocolo de agendamento já existe.")
         else:
             raise
@@ -204,30 +484,49 @@ def agendar_servico(email_usuario: str, servico: str, data: str, horario: str, p
 # Atualizar status de um agendamento
 
 def atualizar_status_agendamento(agendamento_id: int, status: str, email_usuario: str = None) -> bool:
-    with obter_conexao() as conexao:
-        sql = "UPDATE agendamentos SET status = ? WHERE id = ?"
-        parametros = [status, agendamento_id]
-        if email_usuario:
-            sql += " AND usuario_email = ?"
-            parametros.append(email_usuario)
-
-        cursor = conexao.execute(sql, tuple(parametros))
-        conexao.commit()
-        return cursor.rowcount > 0
+    try:
+        with obter_conexao() as conexao:
+            sql = "UPDATE agendamentos SET status = ? WHERE id = ?"
+            parametros = [status, agendamento_id]
+            if email_usuario:
+                sql += " AND usuario_email = ?"
+                parametros.append(email_usuario)
+            sql += " RETURNING data"
+
+            alterados = conexao.execute(sql, tuple(parametros)).fetchall()
+            conexao.commit()
+            invalidar_disponibilidade(*(linha['data'] for linha in alterados))
+            return len(alterados) > 0
+    except sqlite3.IntegrityError as e:
+        # Reativar um agendamento cujo horário já foi ocupado por outra reserva
+        if _conflito_de_horario(e):
+            raise HorarioIndisponivelError("Horário já reservado.")
+        raise
 
 # Alterar data e horário de um agendamento
 
 def alterar_agendamento(agendamento_id: int, nova_data: str, novo_horario: str, email_usuario: str = None) -> bool:
-    with obter_conexao() as conexao:
-        sql = "UPDATE agendamentos SET data = ?, horario = ?, status = 'Agendado' WHERE id = ?"
-        parametros = [nova_data, novo_horario, agendamento_id]
-        if email_usuario:
-            sql += " AND usuario_email = ?"
-            parametros.append(email_usuario)
+    nova_data = normalizar_data(nova_data)
+    try:
+        with obter_conexao() as conexao:
+            anterior = conexao.execute("SELECT data FROM agendamentos WHERE id = ?", (agendamento_id,)).fetchone()
 
-        cursor = conexao.execute(sql, tuple(parametros))
-        conexao.commit()
-        return cursor.rowcount > 0
+            sql = "UPDATE agendamentos SET data = ?, horario = ?, status = 'Agendado' WHERE id = ?"
+            parametros = [nova_data, novo_horario, agendamento_id]
+            if email_usuario:
+                sql += " AND usuario_email = ?"
+                parametros.append(email_usuario)
+
+            cursor = conexao.execute(sql, tuple(parametros))
+            conexao.commit()
+            if cursor.rowcount > 0:
+                invalidar_disponibilidade(anterior['data'], nova_data)
+            return cursor.rowcount > 0
+    except sqlite3.IntegrityError as e:
+        if _conflito_de_horario(e):
+            invalidar_disponibilidade(nova_data)
+            raise HorarioIndisponivelError("Horário já reservado.")
+        raise
 
 # Validar CPF
 
@@ -255,6 +554,16 @@ def validar_data(data_str: str) -> bool:
     except ValueError:
         return False
 
+# Normalizar data para DD/MM/AAAA (com zeros à esquerda), formato gravado no banco
+
+def normalizar_data(data_str: str) -> str:
+    return datetime.strptime(data_str.strip(), '%d/%m/%Y').strftime('%d/%m/%Y')
+
+# Converter data DD/MM/AAAA para o formato ISO usado nas consultas por período
+
+def data_para_iso(data_str: str) -> str:
+    return datetime.strptime(data_str.strip(), '%d/%m/%Y').strftime('%Y-%m-%d')
+
 # Validar e-mail
 
 def validar_email(email: str) -> bool:
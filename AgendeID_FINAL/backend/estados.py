@@ -0,0 +1,281 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from typing import Any, Dict, Iterator, Optional, Set
+
+from backend.database import obter_conexao
+
+# Armazenamentos do estado das conversas do chatbot (chave: e-mail ou id temporário,
+# valor: dict com a etapa e os dados do fluxo). O Chatbot só usa a interface de dict
+# e chama persistir(chave) ao terminar de processar cada mensagem.
+
+class ArmazenamentoEstados(MutableMapping):
+    def persistir(self, chave: str):
+        # Grava as alterações feitas dentro do estado devolvido por self[chave]
+        pass
+
+    def estatisticas(self) -> Dict[str, Any]:
+        return {"ativos": len(self)}
+
+class EstadoConversa(MutableMapping):
+    # Estado de uma conversa com acesso de dict. A etapa fica em um slot e os demais
+    # campos só ganham um dict quando existem: a maioria das conversas anônimas tem
+    # apenas a etapa (login_email, cadastro_nome...).
+    __slots__ = ('etapa', 'campos', 'ultimo_acesso')
+
+    def __init__(self, estado: Optional[Dict[str, Any]] = None):
+        self.etapa = None
+        self.campos = None
+        self.ultimo_acesso = 0.0
+        if estado:
+            self.update(estado)
+
+    def __getitem__(self, chave: str) -> Any:
+        if chave == 'etapa':
+            if self.etapa is None:
+                raise KeyError(chave)
+            return self.etapa
+        if self.campos is None:
+            raise KeyError(chave)
+        return self.campos[chave]
+
+    def __setitem__(self, chave: str, valor: Any):
+        if chave == 'etapa':
+            self.etapa = valor
+        elif self.campos is None:
+            self.campos = {chave: valor}
+        else:
+            self.campos[chave] = valor
+
+    def __delitem__(self, chave: str):
+        if chave == 'etapa' and self.etapa is not None:
+            self.etapa = None
+        elif self.campos is not None and chave in self.campos:
+            del self.campos[chave]
+        else:
+            raise KeyError(chave)
+
+    def __contains__(self, chave: object) -> bool:
+        if chave == 'etapa':
+            return self.etapa is not None
+        return self.campos is not None and chave in self.campos
+
+    def __iter__(self) -> Iterator[str]:
+        if self.etapa is not None:
+            yield 'etapa'
+        if self.campos:
+            yield from list(self.campos)
+
+    def __len__(self) -> int:
+        return (self.etapa is not None) + (len(self.campos) if self.campos else 0)
+
+    def __repr__(self) -> str:
+        return f"EstadoConversa({dict(self)!r})"
+
+class EstadosMemoria(ArmazenamentoEstados):
+    # Estados no próprio processo: rápido, mas cada worker enxerga só as suas conversas.
+    # Conversas paradas há mais de ttl segundos expiram e, acima de tamanho_maximo,
+    # as usadas há mais tempo são descartadas; a memória fica limitada mesmo com
+    # fluxos anônimos abandonados.
+    def __init__(self, tamanho_maximo: int = 10000, ttl: float = 3600.0):
+        self.tamanho_maximo = tamanho_maximo
+        self.ttl = ttl
+        self.expirados = 0
+        self.descartados = 0
+        # Ordem de uso mais recente no fim, logo as expiradas ficam sempre no início
+        self._estados: "OrderedDict[str, EstadoConversa]" = OrderedDict()
+        self._trava = threading.Lock()
+
+    def _remover_expirados(self, agora: float):
+        limite = agora - self.ttl
+        while self._estados:
+            chave, estado = next(iter(self._estados.items()))
+            if estado.ultimo_acesso > limite:
+                break
+            del self._estados[chave]
+            self.expirados += 1
+
+    def __getitem__(self, chave: str) -> EstadoConversa:
+        agora = time.monotonic()
+        with self._trava:
+            self._remover_expirados(agora)
+            estado = self._estados[chave]
+            estado.ultimo_acesso = agora
+            self._estados.move_to_end(chave)
+            return estado
+
+    def __setitem__(self, chave: str, estado: Dict[str, Any]):
+        if not isinstance(estado, EstadoConversa):
+            estado = EstadoConversa(estado)
+        agora = time.monotonic()
+        estado.ultimo_acesso = agora
+        with self._trava:
+            self._remover_expirados(agora)
+            self._estados[chave] = estado
+            self._estados.move_to_end(chave)
+            while len(self._estados) > self.tamanho_maximo:
+                self._estados.popitem(last=False)
+                self.descartados += 1
+
+    def __delitem__(self, chave: str):
+        with self._trava:
+            del self._estados[chave]
+
+    def __contains__(self, chave: object) -> bool:
+        with self._trava:
+            self._remover_expirados(time.monotonic())
+            return chave in self._estados
+
+    def __iter__(self) -> Iterator[str]:
+        with self._trava:
+            self._remover_expirados(time.monotonic())
+            return iter(list(self._estados))
+
+    def __len__(self) -> int:
+        with self._trava:
+            self._remover_expirados(time.monotonic())
+            return len(self._estados)
+
+    def items(self):
+        # Percorrer os estados não conta como uso: não renova prazo nem posição no LRU
+        with self._trava:
+            self._remover_expirados(time.monotonic())
+            return list(self._estados.items())
+
+    def estatisticas(self) -> Dict[str, Any]:
+        return {
+            "ativos": len(self),
+            "expirados": self.expirados,
+            "descartados": self.descartados,
+            "limite": self.tamanho_maximo
+        }
+
+def _serializar(valor: Any):
+    # Linhas do banco guardadas no estado (ex: agendamento a alterar) viram dicts
+    if isinstance(valor, sqlite3.Row):
+        return dict(valor)
+    return str(valor)
+
+class EstadosSQLite(ArmazenamentoEstados):
+    # Estados em uma tabela do banco, compartilhados por todos os workers. O estado lido ou
+    # atribuído fica com a thread até persistir(), para que as alterações feitas durante a
+    # mensagem sejam gravadas de uma só vez; cada gravação renova o prazo de expiração.
+    LIMPEZA_A_CADA = 200
+
+    def __init__(self, ttl: float = 3600.0):
+        self.ttl = ttl
+        self._local = threading.local()
+        self._gravacoes = 0
+
+    @property
+    def _abertos(self) -> Dict[str, Dict[str, Any]]:
+        abertos = getattr(self._local, 'abertos', None)
+        if abertos is None:
+            abertos = self._local.abertos = {}
+        return abertos
+
+    @property
+    def _atribuidos(self) -> Set[str]:
+        # Chaves substituídas por self[chave] = estado desde o último persistir()
+        atribuidos = getattr(self._local, 'atribuidos', None)
+        if atribuidos is None:
+            atribuidos = self._local.atribuidos = set()
+        return atribuidos
+
+    def _gravar(self, chave: str, estado: Dict[str, Any]):
+        agora = time.time()
+        with obter_conexao() as conexao:
+            conexao.execute(
+                """INSERT INTO estados_conversa (chave, estado, expira_em) VALUES (?, ?, ?)
+                   ON CONFLICT(chave) DO UPDATE SET estado = excluded.estado, expira_em = excluded.expira_em""",
+                (chave, json.dumps(estado, default=_serializar), agora + self.ttl)
+            )
+            self._gravacoes += 1
+            if self._gravacoes % self.LIMPEZA_A_CADA == 0:
+                conexao.execute("DELETE FROM estados_conversa WHERE expira_em <= ?", (agora,))
+            conexao.commit()
+
+    def _carregar(self, chave: object) -> Optional[Dict[str, Any]]:
+        abertos = self._abertos
+        if chave in abertos:
+            return abertos[chave]
+        with obter_conexao() as conexao:
+            linha = conexao.execute(
+                "SELECT estado FROM estados_conversa WHERE chave = ? AND expira_em > ?",
+                (chave, time.time())
+            ).fetchone()
+        if linha is None:
+            return None
+        estado = abertos[chave] = json.loads(linha[0])
+        return estado
+
+    def __getitem__(self, chave: str) -> Dict[str, Any]:
+        estado = self._carregar(chave)
+        if estado is None:
+            raise KeyError(chave)
+        return estado
+
+    def __setitem__(self, chave: str, estado: Dict[str, Any]):
+        # Só é gravado no banco por persistir(), ao fim da mensagem
+        self._abertos[chave] = estado
+        self._atribuidos.add(chave)
+
+    def __delitem__(self, chave: str):
+        aberto = self._abertos.pop(chave, None)
+        self._atribuidos.discard(chave)
+        with obter_conexao() as conexao:
+            removidos = conexao.execute("DELETE FROM estados_conversa WHERE chave = ?", (chave,)).rowcount
+            conexao.commit()
+        if not removidos and aberto is None:
+            raise KeyError(chave)
+
+    def __contains__(self, chave: object) -> bool:
+        # O estado encontrado fica retido na thread: o self[chave] que costuma vir em seguida
+        # não consulta o banco de novo
+        return self._carregar(chave) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        with obter_conexao() as conexao:
+            chaves = [linha[0] for linha in conexao.execute(
+                "SELECT chave FROM estados_conversa WHERE expira_em > ?", (time.time(),)
+            )]
+        return iter(chaves)
+
+    def __len__(self) -> int:
+        with obter_conexao() as conexao:
+            return conexao.execute(
+                "SELECT COUNT(*) FROM estados_conversa WHERE expira_em > ?", (time.time(),)
+            ).fetchone()[0]
+
+    def items(self):
+        # Cópias somente leitura em uma única consulta; não ficam retidas pela thread
+        with obter_conexao() as conexao:
+            linhas = conexao.execute(
+                "SELECT chave, estado FROM estados_conversa WHERE expira_em > ?", (time.time(),)
+            ).fetchall()
+        return [(chave, json.loads(estado)) for chave, estado in linhas]
+
+    def persistir(self, chave: str):
+        # Grava o estado da mensagem atual (e outros atribuídos durante ela) e descarta os
+        # demais lidos pela thread, que seriam cópias desatualizadas na próxima requisição
+        abertos, atribuidos = self._abertos, self._atribuidos
+        atribuidos.add(chave)
+        gravar = [(outra, abertos[outra]) for outra in atribuidos if outra in abertos]
+        abertos.clear()
+        atribuidos.clear()
+        for outra, estado in gravar:
+            self._gravar(outra, estado)
+
+def criar_armazenamento_estados() -> ArmazenamentoEstados:
+    # AGENDEID_ESTADOS=memoria (padrão, um único worker) ou sqlite (vários workers)
+    tipo = os.environ.get('AGENDEID_ESTADOS', 'memoria').lower()
+    ttl = float(os.environ.get('AGENDEID_ESTADOS_TTL', '3600'))
+    if tipo == 'memoria':
+        return EstadosMemoria(tamanho_maximo=int(os.environ.get('AGENDEID_ESTADOS_MAXIMO', '10000')), ttl=ttl)
+    if tipo == 'sqlite':
+        return EstadosSQLite(ttl=ttl)
+    raise ValueError(f"Armazenamento de estados desconhecido: {tipo}")
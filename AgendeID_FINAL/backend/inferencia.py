@@ -0,0 +1,233 @@
+import os
+import sys
+import queue
+import threading
+import time
+import numpy as np
+from concurrent.futures import Future
+from typing import List, Optional, Tuple
+
+# Motores de inferência do classificador de intenções. O MotorNumPy executa a rede
+# exportada por exportar_pesos() apenas com multiplicações de matrizes, sem TensorFlow;
+# o MotorKeras mantém o caminho antigo (load_model + predict) para modelos não exportados.
+
+ATIVACOES = {
+    'relu': lambda x: np.maximum(x, 0),
+    'linear': lambda x: x,
+    'softmax': None,  # tratada à parte para ser numericamente estável
+}
+
+def _softmax(x: np.ndarray) -> np.ndarray:
+    x = x - x.max(axis=1, keepdims=True)
+    np.exp(x, out=x)
+    x /= x.sum(axis=1, keepdims=True)
+    return x
+
+class MotorNumPy:
+    def __init__(self, camadas: List[Tuple[np.ndarray, np.ndarray, str]]):
+        for _, _, ativacao in camadas:
+            if ativacao not in ATIVACOES:
+                raise ValueError(f"Ativação não suportada: {ativacao}")
+        self.camadas = [
+            (np.ascontiguousarray(pesos, dtype=np.float32), np.asarray(vieses, dtype=np.float32), ativacao)
+            for pesos, vieses, ativacao in camadas
+        ]
+
+    @classmethod
+    def carregar(cls, caminho: str) -> "MotorNumPy":
+        with np.load(caminho, allow_pickle=False) as arquivo:
+            ativacoes = [str(a) for a in arquivo['ativacoes']]
+            camadas = [(arquivo[f'pesos_{i}'], arquivo[f'vieses_{i}'], ativacao) for i, ativacao in enumerate(ativacoes)]
+        return cls(camadas)
+
+    @property
+    def tamanho_entrada(self) -> int:
+        return self.camadas[0][0].shape[0]
+
+    @property
+    def tamanho_saida(self) -> int:
+        return self.camadas[-1][0].shape[1]
+
+    def prever(self, entrada: np.ndarray) -> np.ndarray:
+        # Dropout não entra aqui: na inferência ele é a identidade
+        saida = np.asarray(entrada, dtype=np.float32)
+        for pesos, vieses, ativacao in self.camadas:
+            saida = saida @ pesos
+            saida += vieses
+            saida = _softmax(saida) if ativacao == 'softmax' else ATIVACOES[ativacao](saida)
+        return saida
+
+class MotorKeras:
+    def __init__(self, caminho_modelo: str):
+        # Importa o TensorFlow somente quando este motor é escolhido
+        from tensorflow.keras.models import load_model
+        self.modelo = load_model(caminho_modelo)
+
+    @property
+    def tamanho_entrada(self) -> int:
+        return self.modelo.input_shape[-1]
+
+    @property
+    def tamanho_saida(self) -> int:
+        return self.modelo.output_shape[-1]
+
+    def prever(self, entrada: np.ndarray) -> np.ndarray:
+        return self.modelo.predict(entrada, verbose=0)
+
+class AgendadorInferencia:
+    # Agrupa as predições de requisições simultâneas em um único forward pass.
+    # O primeiro pedido abre um lote que fecha ao atingir lote_maximo ou após espera_maxima segundos.
+    # Depois de encerrar() as predições passam a ser feitas na própria thread de quem chama
+    def __init__(self, motor, lote_maximo: int = 32, espera_maxima: float = 0.002, tempo_limite: float = 30.0):
+        self.motor = motor
+        self.lote_maximo = max(1, lote_maximo)
+        self.espera_maxima = max(0.0, espera_maxima)
+        self.tempo_limite = tempo_limite
+        self._fechado = False
+        self.lotes_executados = 0
+        self.predicoes = 0
+        self._fila: "queue.Queue[Optional[Tuple[np.ndarray, Future]]]" = queue.Queue()
+        self._trava = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._pid = None
+
+    def _garantir_thread(self):
+        # A thread é criada no primeiro uso (e de novo após um fork) para cada worker ter a sua
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._trava:
+            if not self._fechado and (self._thread is None or self._pid != os.getpid()):
+                self._fila = queue.Queue()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._executar, name="agendador-inferencia", daemon=True)
+                self._thread.start()
+
+    def prever(self, linha: np.ndarray) -> np.ndarray:
+        # Recebe o vetor de uma mensagem e devolve as probabilidades de cada classe
+        if self.lote_maximo == 1 or self._fechado:
+            return self.motor.prever(linha.reshape(1, -1))[0]
+        self._garantir_thread()
+        futuro: Future = Future()
+        # Mesma trava de encerrar(): todo pedido aceito entra na fila antes do sinal de parada
+        with self._trava:
+            aceito = not self._fechado
+            if aceito:
+                self._fila.put((np.array(linha, dtype=np.float32).reshape(-1), futuro))
+        if not aceito:
+            return self.motor.prever(linha.reshape(1, -1))[0]
+        return futuro.result(timeout=self.tempo_limite)
+
+    def _executar(self):
+        fila = self._fila
+        try:
+            self._atender(fila)
+        finally:
+            # Pedidos que ficaram na fila não podem esperar para sempre por uma thread que saiu
+            while True:
+                try:
+                    item = fila.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not None and not item[1].done():
+                    item[1].set_exception(RuntimeError("Agendador de inferência encerrado"))
+
+    def _atender(self, fila: queue.Queue):
+        encerrar = False
+        while True:
+            if encerrar:
+                # Após o sinal de parada só atende o que ainda estiver na fila, sem esperar por mais
+                try:
+                    primeiro = fila.get_nowait()
+                except queue.Empty:
+                    return
+            else:
+                primeiro = fila.get()
+            if primeiro is None:
+                encerrar = True
+                continue
+            lote = [primeiro]
+            prazo = time.monotonic() + self.espera_maxima
+            while len(lote) < self.lote_maximo:
+                restante = prazo - time.monotonic()
+                try:
+                    item = fila.get(timeout=restante) if restante > 0 and not encerrar else fila.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    encerrar = True
+                    continue
+                lote.append(item)
+
+            self._prever_lote(lote)
+
+    def _prever_lote(self, lote: List[Tuple[np.ndarray, Future]]):
+        try:
+            saidas = self.motor.prever(np.stack([entrada for entrada, _ in lote]))
+            for i, (_, futuro) in enumerate(lote):
+                futuro.set_result(saidas[i])
+        except Exception as e:
+            for _, futuro in lote:
+                futuro.set_exception(e)
+        self.lotes_executados += 1
+        self.predicoes += len(lote)
+
+    def encerrar(self):
+        with self._trava:
+            if self._fechado:
+                return
+            self._fechado = True
+            if self._thread is not None and self._pid == os.getpid():
+                self._fila.put(None)
+
+    def estatisticas(self) -> dict:
+        return {
+            "lotes": self.lotes_executados,
+            "predicoes": self.predicoes,
+            "media_por_lote": round(self.predicoes / self.lotes_executados, 2) if self.lotes_executados else 0.0
+        }
+
+def exportar_pesos(modelo, caminho: str):
+    # Grava os pesos das camadas Dense de um modelo Keras no formato lido pelo MotorNumPy
+    arrays = {}
+    ativacoes = []
+    for camada in modelo.layers:
+        if camada.__class__.__name__ == 'Dropout':
+            continue
+        if camada.__class__.__name__ != 'Dense':
+            raise ValueError(f"Camada não suportada na exportação: {camada.__class__.__name__}")
+        pesos, vieses = camada.get_weights()
+        arrays[f'pesos_{len(ativacoes)}'] = pesos
+        arrays[f'vieses_{len(ativacoes)}'] = vieses
+        ativacoes.append(camada.get_config()['activation'])
+    arrays['ativacoes'] = np.array(ativacoes)
+    np.savez(caminho, **arrays)
+
+def carregar_motor(caminho_modelo: str, caminho_pesos: str, tipo: str = 'auto'):
+    # tipo: 'numpy', 'keras' ou 'auto' (NumPy quando os pesos exportados existem)
+    tipo = (tipo or 'auto').lower()
+    if tipo == 'auto':
+        tipo = 'numpy' if os.path.exists(caminho_pesos) else 'keras'
+
+    if tipo == 'numpy':
+        if not os.path.exists(caminho_pesos):
+            return None
+        return MotorNumPy.carregar(caminho_pesos)
+    if tipo == 'keras':
+        if not os.path.exists(caminho_modelo):
+            return None
+        return MotorKeras(caminho_modelo)
+    raise ValueError(f"Motor de inferência desconhecido: {tipo}")
+
+# Exporta os pesos de um modelo .h5 já treinado:
+#   python backend/inferencia.py backend/modelos_salvos/chatbot_model.h5 backend/modelos_salvos/chatbot_pesos.npz
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Uso: python inferencia.py <modelo.h5> <pesos.npz>")
+        sys.exit(1)
+    motor_keras = MotorKeras(sys.argv[1])
+    exportar_pesos(motor_keras.modelo, sys.argv[2])
+
+    # Confere se os dois motores produzem as mesmas probabilidades
+    amostra = np.random.default_rng(0).integers(0, 2, size=(32, motor_keras.tamanho_entrada)).astype(np.float32)
+    np.testing.assert_allclose(MotorNumPy.carregar(sys.argv[2]).prever(amostra), motor_keras.prever(amostra), atol=1e-5)
+    print(f"Pesos exportados para {sys.argv[2]}")
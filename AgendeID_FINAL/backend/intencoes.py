@@ -0,0 +1,94 @@
+import random
+import re
+from collections import deque
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Intenções e tabelas de palavras-chave compiladas no carregamento: respostas indexadas
+# por tag e um único autômato (Aho-Corasick) que encontra todas as palavras-chave e
+# padrões conhecidos em uma passada sobre a mensagem.
+
+def normalizar_comando(texto: str) -> str:
+    # Minúsculas, espaços simples e sem pontuação final ("Meus agendamentos?" -> "meus agendamentos")
+    return re.sub(r'\s+', ' ', texto.lower()).strip().rstrip('?!.,').strip()
+
+class AutomatoPalavras:
+    # Autômato de Aho-Corasick: busca simultânea de vários padrões em tempo linear no texto
+    def __init__(self, padroes: Iterable[Tuple[str, Any]]):
+        self._transicoes: List[Dict[str, int]] = [{}]
+        self._falha: List[int] = [0]
+        self._saidas: List[List[Tuple[int, Any]]] = [[]]
+
+        for padrao, valor in padroes:
+            if not padrao:
+                continue
+            estado = 0
+            for caractere in padrao:
+                proximo = self._transicoes[estado].get(caractere)
+                if proximo is None:
+                    proximo = len(self._transicoes)
+                    self._transicoes.append({})
+                    self._falha.append(0)
+                    self._saidas.append([])
+                    self._transicoes[estado][caractere] = proximo
+                estado = proximo
+            self._saidas[estado].append((len(padrao), valor))
+
+        # Ligações de falha em largura: cada estado herda as saídas do seu sufixo mais longo
+        fila = deque(self._transicoes[0].values())
+        while fila:
+            estado = fila.popleft()
+            for caractere, proximo in self._transicoes[estado].items():
+                fila.append(proximo)
+                falha = self._falha[estado]
+                while falha and caractere not in self._transicoes[falha]:
+                    falha = self._falha[falha]
+                destino = self._transicoes[falha].get(caractere, 0)
+                self._falha[proximo] = destino if destino != proximo else 0
+                self._saidas[proximo] = self._saidas[proximo] + self._saidas[self._falha[proximo]]
+
+    def buscar(self, texto: str) -> Iterator[Tuple[int, int, Any]]:
+        # Gera (início, fim, valor) para cada ocorrência de padrão no texto
+        estado = 0
+        for posicao, caractere in enumerate(texto):
+            while estado and caractere not in self._transicoes[estado]:
+                estado = self._falha[estado]
+            estado = self._transicoes[estado].get(caractere, 0)
+            for tamanho, valor in self._saidas[estado]:
+                yield posicao - tamanho + 1, posicao + 1, valor
+
+class RegistroIntencoes:
+    # tabelas_palavras: {nome da tabela: {palavra-chave: resultado}}; dentro de cada tabela
+    # vale a primeira palavra-chave (na ordem do dicionário) encontrada na mensagem
+    def __init__(self, intencoes: Dict[str, Any], tabelas_palavras: Dict[str, Dict[str, Any]]):
+        self.respostas: Dict[str, List[str]] = {}
+        padroes_exatos: Dict[str, str] = {}
+
+        for intent in intencoes.get('intents', []):
+            # Tags repetidas: vale a primeira que tiver respostas, como na busca linear anterior
+            if intent.get('responses') and intent['tag'] not in self.respostas:
+                self.respostas[intent['tag']] = list(intent['responses'])
+            for padrao in intent.get('patterns', []):
+                padroes_exatos.setdefault(normalizar_comando(padrao), intent['tag'])
+
+        entradas = [(padrao, ('exato', 0, tag)) for padrao, tag in padroes_exatos.items()]
+        for tabela, palavras in tabelas_palavras.items():
+            for prioridade, (palavra, resultado) in enumerate(palavras.items()):
+                entradas.append((palavra, (tabela, prioridade, resultado)))
+        self.automato = AutomatoPalavras(entradas)
+
+    def resposta(self, tag: str) -> Optional[str]:
+        respostas = self.respostas.get(tag)
+        return random.choice(respostas) if respostas else None
+
+    def analisar(self, mensagem: str) -> Dict[str, Any]:
+        # Uma passada pelo autômato: {'exato': tag do padrão igual à mensagem inteira,
+        # <tabela>: resultado da palavra-chave de maior prioridade encontrada}
+        texto = normalizar_comando(mensagem)
+        melhores: Dict[str, Tuple[int, Any]] = {}
+        for inicio, fim, (tabela, prioridade, resultado) in self.automato.buscar(texto):
+            if tabela == 'exato' and (inicio != 0 or fim != len(texto)):
+                continue
+            atual = melhores.get(tabela)
+            if atual is None or prioridade < atual[0]:
+                melhores[tabela] = (prioridade, resultado)
+        return {tabela: resultado for tabela, (_, resultado) in melhores.items()}
@@ -0,0 +1,272 @@
+import re
+import sqlite3
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+def _normalizar_datas_agendamentos(conexao: sqlite3.Connection):
+    # Datas gravadas sem zeros à esquerda (ex: 1/2/2025) não podem ser convertidas por substr()
+    irregulares = conexao.execute(
+        "SELECT id, data FROM agendamentos WHERE data NOT GLOB '[0-3][0-9]/[01][0-9]/[0-9][0-9][0-9][0-9]'"
+    ).fetchall()
+    for agendamento_id, data in irregulares:
+        try:
+            data_normalizada = datetime.strptime(data.strip(), '%d/%m/%Y').strftime('%d/%m/%Y')
+        except ValueError:
+            print(f"Agendamento {agendamento_id} com data inválida mantido: {data}")
+            continue
+        conexao.execute("UPDATE agendamentos SET data = ? WHERE id = ?", (data_normalizada, agendamento_id))
+
+def _verificar_reservas_duplicadas(conexao: sqlite3.Connection):
+    # O índice único não pode ser criado enquanto houver duas reservas ativas no mesmo horário.
+    # A migração não altera reservas de clientes: ela falha listando os conflitos, que devem ser
+    # resolvidos no banco (cancelando ou remarcando uma das reservas) antes de subir de novo
+    duplicadas = conexao.execute("""
+        SELECT data, horario, group_concat(id, ', ') FROM (
+            SELECT id, data, horario FROM agendamentos
+            WHERE status IN ('Agendado', 'Presente', 'Atendido')
+            ORDER BY data, horario, id
+        )
+        GROUP BY data, horario
+        HAVING COUNT(*) > 1
+        ORDER BY data, horario
+    """).fetchall()
+    if duplicadas:
+        conflitos = '; '.join(f"{data} {horario}: agendamentos {ids}" for data, horario, ids in duplicadas)
+        raise sqlite3.IntegrityError(f"Reservas ativas em conflito no mesmo horário ({conflitos})")
+
+# Migrações versionadas do esquema. Cada item é (versão, descrição, comandos)
+# e só é executado uma vez por banco; novas versões devem ser acrescentadas ao final.
+# Um comando pode ser SQL ou uma função que recebe a conexão (ajustes de dados).
+MIGRACOES: List[Tuple[int, str, Tuple[Union[str, Callable[[sqlite3.Connection], None]], ...]]] = [
+    (1, "tabelas de usuários e agendamentos", (
+        """
+        CREATE TABLE IF NOT EXISTS usuarios (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nome TEXT NOT NULL,
+            sexo TEXT NOT NULL,
+            nacionalidade TEXT NOT NULL,
+            data_nascimento TEXT NOT NULL,
+            nome_mae TEXT NOT NULL,
+            cpf TEXT UNIQUE NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            senha TEXT NOT NULL,
+            telefone TEXT,
+            tipo TEXT DEFAULT 'cliente',
+            ativo BOOLEAN DEFAULT 1,
+            data_cadastro DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS agendamentos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            usuario_email TEXT NOT NULL,
+            servico TEXT NOT NULL,
+            data TEXT NOT NULL,
+            horario TEXT NOT NULL,
+            status TEXT DEFAULT 'Agendado',
+            protocolo TEXT UNIQUE,
+            observacoes TEXT,
+            data_criacao DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (usuario_email) REFERENCES usuarios(email) ON DELETE CASCADE
+        )
+        """,
+    )),
+    (2, "índices das consultas de disponibilidade e de agendamentos por usuário", (
+        "CREATE INDEX IF NOT EXISTS idx_agendamentos_data_status_horario ON agendamentos (data, status, horario)",
+        "CREATE INDEX IF NOT EXISTS idx_agendamentos_usuario_data_horario ON agendamentos (usuario_email, data, horario)",
+    )),
+    # A coluna gerada é virtual: o ALTER não reescreve a tabela e só o índice é construído
+    (3, "data em formato ISO (AAAA-MM-DD) com índice de cobertura para relatórios", (
+        _normalizar_datas_agendamentos,
+        """
+        ALTER TABLE agendamentos ADD COLUMN data_iso TEXT
+        GENERATED ALWAYS AS (substr(data, 7, 4) || '-' || substr(data, 4, 2) || '-' || substr(data, 1, 2)) VIRTUAL
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_agendamentos_data_iso ON agendamentos (data_iso, status, servico, horario)",
+    )),
+    # Um horário só pode ter uma reserva ativa: a reserva vira um INSERT que falha em caso de conflito
+    (4, "reserva única por data e horário para agendamentos ativos", (
+        _verificar_reservas_duplicadas,
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_agendamentos_vaga_ativa ON agendamentos (data, horario)
+        WHERE status IN ('Agendado', 'Presente', 'Atendido')
+        """,
+    )),
+    # Estados de conversa compartilhados entre workers (AGENDEID_ESTADOS=sqlite)
+    (5, "estados de conversa do chatbot com expiração", (
+        """
+        CREATE TABLE IF NOT EXISTS estados_conversa (
+            chave TEXT PRIMARY KEY,
+            estado TEXT NOT NULL,
+            expira_em REAL NOT NULL
+        ) WITHOUT ROWID
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_estados_conversa_expira_em ON estados_conversa (expira_em)",
+    )),
+    # O id entra implicitamente no fim do índice: a ordem (data_iso, horario, id) vem pronta
+    (6, "ordem do relatório completo para paginação por cursor", (
+        "CREATE INDEX IF NOT EXISTS idx_agendamentos_data_iso_horario ON agendamentos (data_iso, horario)",
+    )),
+    # Contagens por dia, status e serviço mantidas por gatilhos na mesma transação de cada escrita
+    # em agendamentos; os relatórios somam dias em vez de recontar agendamentos
+    (7, "estatísticas diárias de agendamentos", (
+        """
+        CREATE TABLE IF NOT EXISTS estatisticas_diarias (
+            data_iso TEXT NOT NULL,
+            status TEXT NOT NULL,
+            servico TEXT NOT NULL,
+            quantidade INTEGER NOT NULL,
+            PRIMARY KEY (data_iso, status, servico)
+        ) WITHOUT ROWID
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_estatisticas_insercao AFTER INSERT ON agendamentos
+        BEGIN
+            INSERT INTO estatisticas_diarias (data_iso, status, servico, quantidade)
+            VALUES (NEW.data_iso, coalesce(NEW.status, ''), NEW.servico, 1)
+            ON CONFLICT (data_iso, status, servico) DO UPDATE SET quantidade = quantidade + 1;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_estatisticas_remocao AFTER DELETE ON agendamentos
+        BEGIN
+            UPDATE estatisticas_diarias SET quantidade = quantidade - 1
+            WHERE data_iso = OLD.data_iso AND status = coalesce(OLD.status, '') AND servico = OLD.servico;
+            DELETE FROM estatisticas_diarias
+            WHERE data_iso = OLD.data_iso AND status = coalesce(OLD.status, '') AND servico = OLD.servico
+              AND quantidade <= 0;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_estatisticas_alteracao AFTER UPDATE OF data, status, servico ON agendamentos
+        WHEN OLD.data IS NOT NEW.data OR OLD.status IS NOT NEW.status OR OLD.servico IS NOT NEW.servico
+        BEGIN
+            UPDATE estatisticas_diarias SET quantidade = quantidade - 1
+            WHERE data_iso = OLD.data_iso AND status = coalesce(OLD.status, '') AND servico = OLD.servico;
+            DELETE FROM estatisticas_diarias
+            WHERE data_iso = OLD.data_iso AND status = coalesce(OLD.status, '') AND servico = OLD.servico
+              AND quantidade <= 0;
+            INSERT INTO estatisticas_diarias (data_iso, status, servico, quantidade)
+            VALUES (NEW.data_iso, coalesce(NEW.status, ''), NEW.servico, 1)
+            ON CONFLICT (data_iso, status, servico) DO UPDATE SET quantidade = quantidade + 1;
+        END
+        """,
+        """
+        INSERT OR REPLACE INTO estatisticas_diarias (data_iso, status, servico, quantidade)
+        SELECT data_iso, coalesce(status, ''), servico, COUNT(*) FROM agendamentos
+        GROUP BY data_iso, coalesce(status, ''), servico
+        """,
+    )),
+    # Contador incrementado a cada escrita em agendamentos, inclusive de outros workers;
+    # resultados em cache calculados com uma versão anterior deixam de valer
+    (8, "versão dos dados de agendamentos", (
+        """
+        CREATE TABLE IF NOT EXISTS versao_dados (
+            tabela TEXT PRIMARY KEY,
+            versao INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+        """,
+        "INSERT OR IGNORE INTO versao_dados (tabela, versao) VALUES ('agendamentos', 0)",
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_versao_agendamentos_insercao AFTER INSERT ON agendamentos
+        BEGIN
+            UPDATE versao_dados SET versao = versao + 1 WHERE tabela = 'agendamentos';
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_versao_agendamentos_alteracao AFTER UPDATE ON agendamentos
+        BEGIN
+            UPDATE versao_dados SET versao = versao + 1 WHERE tabela = 'agendamentos';
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_versao_agendamentos_remocao AFTER DELETE ON agendamentos
+        BEGIN
+            UPDATE versao_dados SET versao = versao + 1 WHERE tabela = 'agendamentos';
+        END
+        """,
+    )),
+    # Listagem paginada por usuário em ordem cronológica; o rowid (id) completa a chave do índice.
+    # Substitui o índice por (usuario_email, data, horario), cuja ordem DD/MM/AAAA não é cronológica
+    (9, "índice de agendamentos por usuário em ordem de data ISO", (
+        "CREATE INDEX IF NOT EXISTS idx_agendamentos_usuario_data_iso ON agendamentos (usuario_email, data_iso, horario)",
+        "DROP INDEX IF EXISTS idx_agendamentos_usuario_data_horario",
+    )),
+]
+
+def versao_atual(conexao: sqlite3.Connection) -> int:
+    # Versão mais recente já aplicada ao banco (0 para um banco novo)
+    versao = conexao.execute("SELECT MAX(versao) FROM schema_version").fetchone()[0]
+    return versao or 0
+
+def gatilhos_das_migracoes(ate_versao: Optional[int] = None) -> Dict[str, str]:
+    # nome do gatilho -> CREATE TRIGGER, na ordem das migrações
+    gatilhos = {}
+    for versao, _, comandos in MIGRACOES:
+        if ate_versao is not None and versao > ate_versao:
+            break
+        for comando in comandos:
+            if isinstance(comando, str):
+                encontrado = re.search(r'CREATE TRIGGER IF NOT EXISTS (\w+)', comando)
+                if encontrado:
+                    gatilhos[encontrado.group(1)] = comando
+    return gatilhos
+
+def restaurar_gatilhos(conexao: sqlite3.Connection) -> List[str]:
+    # Recria os gatilhos de migrações já aplicadas que não existem mais no banco
+    # (uma carga em massa interrompida antes de devolvê-los, por exemplo)
+    existentes = {linha[0] for linha in conexao.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")}
+    faltando = {
+        nome: comando for nome, comando in gatilhos_das_migracoes(versao_atual(conexao)).items()
+        if nome not in existentes
+    }
+    if not faltando:
+        return []
+    conexao.execute("BEGIN IMMEDIATE")
+    try:
+        for comando in faltando.values():
+            conexao.execute(comando)
+        conexao.commit()
+    except sqlite3.Error:
+        conexao.rollback()
+        raise
+    return list(faltando)
+
+def aplicar_migracoes(conexao: sqlite3.Connection) -> List[int]:
+    # Aplica somente as migrações pendentes; cada uma roda na sua própria transação
+    conexao.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            versao INTEGER PRIMARY KEY,
+            descricao TEXT NOT NULL,
+            aplicada_em DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conexao.commit()
+
+    ultima = MIGRACOES[-1][0]
+    if versao_atual(conexao) >= ultima:
+        return []
+
+    aplicadas = []
+    for versao, descricao, comandos in MIGRACOES:
+        # BEGIN IMMEDIATE impede que dois workers apliquem a mesma migração ao subir juntos
+        conexao.execute("BEGIN IMMEDIATE")
+        try:
+            if versao <= versao_atual(conexao):
+                conexao.rollback()
+                continue
+            for comando in comandos:
+                if callable(comando):
+                    comando(conexao)
+                else:
+                    conexao.execute(comando)
+            conexao.execute(
+                "INSERT INTO schema_version (versao, descricao) VALUES (?, ?)",
+                (versao, descricao)
+            )
+            conexao.commit()
+            aplicadas.append(versao)
+        except sqlite3.Error:
+            conexao.rollback()
+            raise
+    return aplicadas
@@ -0,0 +1,113 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Callable, Dict, Optional
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# Hash e verificação de senhas em um pool próprio de threads. O scrypt/pbkdf2 do hashlib
+# libera o GIL, então as threads rodam em paralelo; o limite do pool impede que uma rajada
+# de logins ocupe todos os núcleos do worker e atrase as demais requisições.
+
+# Método no formato do werkzeug, ex: scrypt:32768:8:1 ou pbkdf2:sha256:1000000
+METODO_SENHA = os.environ.get('AGENDEID_SENHA_METODO', 'scrypt:32768:8:1')
+
+# Hashes calculados ao mesmo tempo e quantos podem aguardar na fila antes de bloquear quem chama
+PARALELISMO_SENHAS = int(os.environ.get('AGENDEID_SENHA_PARALELISMO', str(min(4, os.cpu_count() or 1))))
+FILA_MAXIMA_SENHAS = int(os.environ.get('AGENDEID_SENHA_FILA', '64'))
+
+class PoolSenhas:
+    def __init__(self, paralelismo: int = PARALELISMO_SENHAS, fila_maxima: int = FILA_MAXIMA_SENHAS):
+        self.paralelismo = max(1, paralelismo)
+        self.fila_maxima = max(1, fila_maxima)
+        self.operacoes = 0
+        self.rehashes = 0
+        self.tempo_total = 0.0
+        self.tempo_maximo = 0.0
+        self.pendentes = 0
+        self._vagas = threading.BoundedSemaphore(self.paralelismo + self.fila_maxima)
+        self._trava = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pid = None
+
+    def _obter_executor(self) -> ThreadPoolExecutor:
+        # Recriado após um fork: threads não sobrevivem no processo filho
+        if self._executor is None or self._pid != os.getpid():
+            with self._trava:
+                if self._executor is None or self._pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(self.paralelismo, thread_name_prefix="senhas")
+                    self._pid = os.getpid()
+        return self._executor
+
+    def _executar(self, funcao: Callable[..., Any], *args) -> Any:
+        self._vagas.acquire()
+        with self._trava:
+            self.pendentes += 1
+        try:
+            futuro = self._obter_executor().submit(self._medir, funcao, *args)
+            return futuro.result()
+        finally:
+            with self._trava:
+                self.pendentes -= 1
+            self._vagas.release()
+
+    def _medir(self, funcao: Callable[..., Any], *args) -> Any:
+        inicio = time.perf_counter()
+        try:
+            return funcao(*args)
+        finally:
+            duracao = time.perf_counter() - inicio
+            with self._trava:
+                self.operacoes += 1
+                self.tempo_total += duracao
+                self.tempo_maximo = max(self.tempo_maximo, duracao)
+
+    def gerar_hash(self, senha: str) -> str:
+        return self._executar(generate_password_hash, senha, METODO_SENHA)
+
+    def verificar(self, senha_hash: str, senha: str) -> bool:
+        return self._executar(check_password_hash, senha_hash, senha)
+
+    def registrar_rehash(self):
+        with self._trava:
+            self.rehashes += 1
+
+    def estatisticas(self) -> Dict[str, Any]:
+        with self._trava:
+            return {
+                "metodo": METODO_SENHA,
+                "paralelismo": self.paralelismo,
+                "operacoes": self.operacoes,
+                "rehashes": self.rehashes,
+                "fila": max(0, self.pendentes - self.paralelismo),
+                "em_andamento": min(self.pendentes, self.paralelismo),
+                "latencia_media_ms": round(self.tempo_total / self.operacoes * 1000, 2) if self.operacoes else 0.0,
+                "latencia_maxima_ms": round(self.tempo_maximo * 1000, 2)
+            }
+
+pool_senhas = PoolSenhas()
+
+def gerar_hash_senha(senha: str) -> str:
+    return pool_senhas.gerar_hash(senha)
+
+def verificar_senha(senha_hash: str, senha: str) -> bool:
+    return pool_senhas.verificar(senha_hash, senha)
+
+@lru_cache(maxsize=1)
+def _metodo_completo() -> str:
+    # O werkzeug grava o método com todos os parâmetros de custo antes do primeiro '$'
+    # (ex: "pbkdf2:sha256" vira "pbkdf2:sha256:1000000")
+    return generate_password_hash('', METODO_SENHA).split('$', 1)[0]
+
+def precisa_rehash(senha_hash: str) -> bool:
+    return senha_hash.split('$', 1)[0] != _metodo_completo()
+
+def novo_hash_se_desatualizado(senha_hash: str, senha: str) -> Optional[str]:
+    # Chamada após uma verificação bem-sucedida: devolve o hash com o custo atual, se mudou
+    if not precisa_rehash(senha_hash):
+        return None
+    novo_hash = gerar_hash_senha(senha)
+    pool_senhas.registrar_rehash()
+    return novo_hash
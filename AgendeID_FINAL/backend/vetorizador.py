@@ -0,0 +1,50 @@
+import threading
+from functools import lru_cache
+from typing import Iterable, List, Optional
+
+import nltk
+import numpy as np
+from nltk.stem import PorterStemmer
+
+# Pré-processamento compartilhado entre o treino (chatbot_model_treino.py) e o servidor,
+# para que as características vistas pelo modelo sejam sempre as mesmas.
+
+_stemmer = PorterStemmer()
+
+# O vocabulário das conversas é pequeno: cada palavra é reduzida ao radical uma única vez
+_radical = lru_cache(maxsize=8192)(_stemmer.stem)
+
+def tokenizar(texto: str) -> List[str]:
+    return [_radical(token) for token in nltk.word_tokenize(texto.lower())]
+
+class Vetorizador:
+    # Converte textos em vetores bag-of-words usando um índice palavra -> posição,
+    # com custo proporcional à quantidade de tokens e não ao tamanho do vocabulário
+    def __init__(self, palavras: Iterable[str]):
+        self.palavras = list(palavras)
+        self.indices = {palavra: i for i, palavra in enumerate(self.palavras)}
+        self._local = threading.local()
+
+    def __len__(self) -> int:
+        return len(self.palavras)
+
+    def indices_de(self, texto: str) -> List[int]:
+        # Posições do vocabulário presentes no texto, sem repetição e em ordem
+        return sorted({self.indices[token] for token in tokenizar(texto) if token in self.indices})
+
+    def vetorizar(self, texto: str, indices: Optional[List[int]] = None) -> np.ndarray:
+        # Retorna uma matriz (1, vocabulário) reaproveitada a cada chamada na mesma thread;
+        # quem precisar guardar o vetor deve copiá-lo
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is None or buffer.shape[1] != len(self.palavras):
+            buffer = self._local.buffer = np.zeros((1, len(self.palavras)), dtype=np.float32)
+        else:
+            buffer.fill(0)
+        buffer[0, self.indices_de(texto) if indices is None else indices] = 1
+        return buffer
+
+    def vetorizar_lote(self, textos: List[str]) -> np.ndarray:
+        lote = np.zeros((len(textos), len(self.palavras)), dtype=np.float32)
+        for linha, texto in enumerate(textos):
+            lote[linha, self.indices_de(texto)] = 1
+        return lote
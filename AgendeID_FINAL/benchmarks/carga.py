@@ -0,0 +1,339 @@
+import argparse
+import json
+import math
+import os
+import random
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from http.cookiejar import CookieJar
+from typing import Any, Dict, List, Optional, Tuple
+
+# Teste de carga ponta a ponta: sobe o app.py com um banco temporário, executa conversas
+# completas no chat (cadastro -> login -> agendar -> meus agendamentos -> cancelar) e
+# consultas a /agendamentos/disponiveis e /relatorios com N usuários simultâneos, e grava
+# p50/p95/p99 e vazão por rota e por etapa do chat em JSON para comparar execuções.
+#
+#   python benchmarks/carga.py --usuarios 50 --concorrencia 8
+#   python benchmarks/carga.py --servidor uvicorn --workers 4 --estados sqlite
+#
+# Tudo roda em 127.0.0.1; o banco temporário é apagado ao final (--manter-banco para inspecionar).
+
+RAIZ_PROJETO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASTA_RESULTADOS = os.path.join(RAIZ_PROJETO, 'benchmarks', 'resultados')
+
+SENHA_CARGA = 'senha-carga-123'
+SERVICOS = ('RG', 'CNH', 'CPF', 'Passaporte', 'Título de eleitor')
+TENTATIVAS_HORARIO = 10
+
+class FalhaFluxo(Exception):
+    pass
+
+def gerar_cpf(aleatorio: random.Random) -> str:
+    # Nove dígitos aleatórios e os dois verificadores, na mesma regra de validar_cpf
+    base = [aleatorio.randint(0, 9) for _ in range(9)]
+    while len(set(base)) == 1:
+        base = [aleatorio.randint(0, 9) for _ in range(9)]
+    for peso in (10, 11):
+        resto = 11 - sum(digito * (peso - i) for i, digito in enumerate(base)) % 11
+        base.append(0 if resto > 9 else resto)
+    return ''.join(map(str, base))
+
+def porta_livre() -> int:
+    with socket.socket() as soquete:
+        soquete.bind(('127.0.0.1', 0))
+        return soquete.getsockname()[1]
+
+def percentil(ordenados: List[float], p: float) -> float:
+    # Método do posto mais próximo
+    if not ordenados:
+        return 0.0
+    return ordenados[min(len(ordenados) - 1, max(0, math.ceil(p / 100 * len(ordenados)) - 1))]
+
+class Medicoes:
+    def __init__(self):
+        self.latencias: Dict[str, List[float]] = defaultdict(list)
+        self.erros: Dict[str, int] = defaultdict(int)
+        self._trava = threading.Lock()
+
+    def registrar(self, rotulo: str, duracao: float, sucesso: bool):
+        with self._trava:
+            self.latencias[rotulo].append(duracao)
+            if not sucesso:
+                self.erros[rotulo] += 1
+
+    def resumo(self, duracao_total: float, prefixo: str) -> Dict[str, Dict[str, Any]]:
+        resultado = {}
+        with self._trava:
+            for rotulo in sorted(self.latencias):
+                if not rotulo.startswith(prefixo):
+                    continue
+                ordenadas = sorted(self.latencias[rotulo])
+                resultado[rotulo[len(prefixo):]] = {
+                    "requisicoes": len(ordenadas),
+                    "erros": self.erros.get(rotulo, 0),
+                    "p50_ms": round(percentil(ordenadas, 50) * 1000, 2),
+                    "p95_ms": round(percentil(ordenadas, 95) * 1000, 2),
+                    "p99_ms": round(percentil(ordenadas, 99) * 1000, 2),
+                    "media_ms": round(sum(ordenadas) / len(ordenadas) * 1000, 2),
+                    "maximo_ms": round(ordenadas[-1] * 1000, 2),
+                    "vazao_rps": round(len(ordenadas) / duracao_total, 2) if duracao_total else 0.0
+                }
+        return resultado
+
+class Cliente:
+    # Um navegador: cookie de sessão próprio, requisições medidas por rota e por etapa do chat
+    def __init__(self, base: str, medicoes: Medicoes, tempo_limite: float):
+        self.base = base
+        self.medicoes = medicoes
+        self.tempo_limite = tempo_limite
+        self.abridor = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()))
+
+    def requisitar(self, metodo: str, caminho: str, corpo: Optional[dict] = None) -> Tuple[int, bytes, float]:
+        dados = json.dumps(corpo).encode('utf-8') if corpo is not None else None
+        requisicao = urllib.request.Request(self.base + caminho, data=dados, method=metodo)
+        if dados is not None:
+            requisicao.add_header('Content-Type', 'application/json')
+        inicio = time.perf_counter()
+        try:
+            with self.abridor.open(requisicao, timeout=self.tempo_limite) as resposta:
+                conteudo = resposta.read()
+                codigo = resposta.status
+        except urllib.error.HTTPError as erro:
+            conteudo = erro.read()
+            codigo = erro.code
+        except (urllib.error.URLError, OSError):
+            conteudo, codigo = b'', 0
+        return codigo, conteudo, time.perf_counter() - inicio
+
+    def consultar(self, caminho: str, parametros: dict) -> bool:
+        codigo, _, duracao = self.requisitar('GET', f"{caminho}?{urllib.parse.urlencode(parametros)}")
+        sucesso = codigo == 200
+        self.medicoes.registrar(f"rota:GET {caminho}", duracao, sucesso)
+        return sucesso
+
+    def chat(self, etapa: str, mensagem: str, esperado: Optional[str] = None) -> str:
+        codigo, conteudo, duracao = self.requisitar('POST', '/chat', {"mensagem": mensagem})
+        resposta = ''
+        if codigo == 200:
+            try:
+                resposta = json.loads(conteudo).get('resposta', '')
+            except ValueError:
+                codigo = 0
+        sucesso = codigo == 200 and (esperado is None or esperado in resposta)
+        self.medicoes.registrar("rota:POST /chat", duracao, codigo == 200)
+        self.medicoes.registrar(f"chat:{etapa}", duracao, sucesso)
+        if not sucesso:
+            raise FalhaFluxo(f"{etapa}: HTTP {codigo} {resposta[:120]!r}")
+        return resposta
+
+def cadastrar_e_entrar(cliente: Cliente, aleatorio: random.Random, email: str, tipo: str):
+    cliente.chat("cadastro", "cadastro", "nome completo")
+    cliente.chat("cadastro_nome", f"Usuário de Carga {email.split('@')[0]}", "cliente ou funcionário")
+    cliente.chat("cadastro_tipo", tipo, "sexo")
+    cliente.chat("cadastro_sexo", aleatorio.choice(('masculino', 'feminino', 'outro')), "nacionalidade")
+    cliente.chat("cadastro_nacionalidade", "Brasileira", "nascimento")
+    nascimento = date(1950, 1, 1) + timedelta(days=aleatorio.randint(0, 365 * 55))
+    cliente.chat("cadastro_nascimento", nascimento.strftime('%d/%m/%Y'), "mãe")
+    cliente.chat("cadastro_nome_mae", "Maria de Carga", "CPF")
+    cliente.chat("cadastro_cpf", gerar_cpf(aleatorio), "e-mail")
+    cliente.chat("cadastro_email", email, "senha")
+    cliente.chat("cadastro_senha", SENHA_CARGA, "Cadastro concluído")
+    cliente.chat("login", "login", "e-mail")
+    cliente.chat("login_email", email, "senha")
+    cliente.chat("login_senha", SENHA_CARGA, "Login realizado")
+
+def horarios_da_resposta(resposta: str) -> List[str]:
+    return re.findall(r'\b\d{2}:\d{2}\b', resposta.split('disponíveis para', 1)[-1])
+
+def agendar(cliente: Cliente, aleatorio: random.Random, dia: date) -> int:
+    cliente.chat("agendar", "agendar", "serviço")
+    cliente.chat("agendar_servico", aleatorio.choice(SERVICOS), "data")
+    for _ in range(TENTATIVAS_HORARIO):
+        resposta = cliente.chat("agendar_data", dia.strftime('%d/%m/%Y'))
+        horarios = horarios_da_resposta(resposta) if "Horários disponíveis para" in resposta else []
+        while horarios:
+            resposta = cliente.chat("agendar_horario", aleatorio.choice(horarios))
+            encontrado = re.search(r'ID: (\d+)', resposta)
+            if encontrado:
+                return int(encontrado.group(1))
+            if "outra data" in resposta:
+                break
+            if "reservado por outra pessoa" not in resposta:
+                raise FalhaFluxo(f"agendar_horario: {resposta[:120]!r}")
+            horarios = horarios_da_resposta(resposta)
+        # Dia lotado: tenta o seguinte
+        dia += timedelta(days=1)
+    raise FalhaFluxo("agendar: nenhum horário livre encontrado")
+
+def usuario_virtual(indice: int, base: str, medicoes: Medicoes, funcionario: Cliente, argumentos) -> Optional[str]:
+    # Conversa completa de um cliente seguida de consultas às rotas de disponibilidade e relatórios.
+    # Devolve a descrição da falha ou None
+    aleatorio = random.Random(argumentos.semente * 100003 + indice)
+    cliente = Cliente(base, medicoes, argumentos.tempo_limite)
+    hoje = date.today()
+    dia = hoje + timedelta(days=1 + indice % argumentos.dias)
+    try:
+        cadastrar_e_entrar(cliente, aleatorio, f"carga{indice}@exemplo.com", "cliente")
+        agendamento_id = agendar(cliente, aleatorio, dia)
+        cliente.chat("meus_agendamentos", "meus agendamentos", f"ID: {agendamento_id}")
+        cliente.chat("cancelar", "cancelar agendamento", "ID do agendamento")
+        cliente.chat("cancelar_id", str(agendamento_id), "cancelado com sucesso")
+    except FalhaFluxo as falha:
+        return f"usuário {indice}: {falha}"
+
+    for _ in range(argumentos.consultas):
+        consulta = hoje + timedelta(days=aleatorio.randint(0, argumentos.dias))
+        cliente.consultar('/agendamentos/disponiveis', {"data": consulta.strftime('%d/%m/%Y')})
+        inicio = hoje - timedelta(days=aleatorio.randint(0, 30))
+        funcionario.consultar('/relatorios', {
+            "tipo": "estatistico",
+            "data_inicio": inicio.strftime('%d/%m/%Y'),
+            "data_fim": (inicio + timedelta(days=30)).strftime('%d/%m/%Y')
+        })
+    return None
+
+def comando_servidor(argumentos, porta: int) -> List[str]:
+    if argumentos.servidor == 'uvicorn':
+        return [sys.executable, '-m', 'uvicorn', 'asgi:aplicacao', '--host', '127.0.0.1',
+                '--port', str(porta), '--workers', str(argumentos.workers), '--log-level', 'warning']
+    return [sys.executable, '-m', 'flask', '--app', 'app', 'run', '--host', '127.0.0.1',
+            '--port', str(porta), '--no-reload', '--no-debugger', '--with-threads']
+
+def aguardar_servidor(base: str, processo: subprocess.Popen, tempo_limite: float) -> bool:
+    # Espera o modelo carregar (/status?ready=1); sem modelo treinado o chat usa palavras-chave
+    limite = time.monotonic() + tempo_limite
+    while time.monotonic() < limite:
+        if processo.poll() is not None:
+            return False
+        try:
+            with urllib.request.urlopen(base + '/status?ready=1', timeout=2) as resposta:
+                if resposta.status == 200:
+                    return True
+        except (urllib.error.URLError, OSError):
+            pass
+        time.sleep(0.25)
+    return False
+
+def executar(argumentos) -> Dict[str, Any]:
+    pasta = tempfile.mkdtemp(prefix='agendeid-carga-')
+    porta = argumentos.porta or porta_livre()
+    base = f"http://127.0.0.1:{porta}"
+    ambiente = dict(
+        os.environ,
+        AGENDEID_BANCO=os.path.join(pasta, 'banco.db'),
+        AGENDEID_LIMITES='0',
+        AGENDEID_COOKIE_SEGURO='0',
+        AGENDEID_ESTADOS=argumentos.estados,
+        FLASK_SECRET_KEY='chave-do-teste-de-carga'
+    )
+    log_servidor = open(os.path.join(pasta, 'servidor.log'), 'wb')
+    processo = subprocess.Popen(
+        comando_servidor(argumentos, porta), cwd=RAIZ_PROJETO, env=ambiente,
+        stdout=log_servidor, stderr=subprocess.STDOUT
+    )
+    try:
+        if not aguardar_servidor(base, processo, argumentos.tempo_inicio):
+            log_servidor.flush()
+            with open(log_servidor.name, 'rb') as arquivo:
+                sys.stderr.write(arquivo.read()[-4000:].decode('utf-8', 'replace'))
+            raise SystemExit("O servidor não ficou pronto a tempo.")
+
+        medicoes = Medicoes()
+        # Funcionário que consulta os relatórios; seu cadastro não entra nas medições
+        funcionario = Cliente(base, Medicoes(), argumentos.tempo_limite)
+        cadastrar_e_entrar(funcionario, random.Random(argumentos.semente), "funcionario.carga@exemplo.com", "funcionario")
+        funcionario.medicoes = medicoes
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(argumentos.concorrencia) as executor:
+            falhas = [falha for falha in executor.map(
+                lambda indice: usuario_virtual(indice, base, medicoes, funcionario, argumentos),
+                range(argumentos.usuarios)
+            ) if falha]
+        duracao = time.perf_counter() - inicio
+
+        total = sum(len(latencias) for rotulo, latencias in medicoes.latencias.items() if rotulo.startswith('rota:'))
+        return {
+            "executado_em": datetime.now().isoformat(timespec='seconds'),
+            "configuracao": {
+                "servidor": argumentos.servidor,
+                "workers": argumentos.workers if argumentos.servidor == 'uvicorn' else 1,
+                "estados": argumentos.estados,
+                "usuarios": argumentos.usuarios,
+                "concorrencia": argumentos.concorrencia,
+                "consultas_por_usuario": argumentos.consultas,
+                "dias": argumentos.dias,
+                "semente": argumentos.semente
+            },
+            "duracao_s": round(duracao, 3),
+            "requisicoes": total,
+            "vazao_rps": round(total / duracao, 2) if duracao else 0.0,
+            "fluxos_com_falha": len(falhas),
+            "falhas": falhas[:20],
+            "rotas": medicoes.resumo(duracao, 'rota:'),
+            "etapas_chat": medicoes.resumo(duracao, 'chat:')
+        }
+    finally:
+        processo.terminate()
+        try:
+            processo.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            processo.kill()
+        log_servidor.close()
+        if argumentos.manter_banco:
+            print(f"Banco e log do servidor mantidos em {pasta}")
+        else:
+            shutil.rmtree(pasta, ignore_errors=True)
+
+def imprimir_resumo(resultado: Dict[str, Any]):
+    print(f"{resultado['requisicoes']} requisições em {resultado['duracao_s']} s "
+          f"({resultado['vazao_rps']} req/s), {resultado['fluxos_com_falha']} fluxos com falha")
+    for grupo in ('rotas', 'etapas_chat'):
+        print(f"\n{grupo:<32} {'n':>6} {'erros':>6} {'p50':>9} {'p95':>9} {'p99':>9}")
+        for rotulo, dados in resultado[grupo].items():
+            print(f"{rotulo:<32} {dados['requisicoes']:>6} {dados['erros']:>6} "
+                  f"{dados['p50_ms']:>9} {dados['p95_ms']:>9} {dados['p99_ms']:>9}")
+    for falha in resultado['falhas']:
+        print(f"falha: {falha}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga do AgendeID (latência e vazão por rota e etapa do chat).")
+    parser.add_argument('--usuarios', type=int, default=20, help="conversas completas a executar")
+    parser.add_argument('--concorrencia', type=int, default=4, help="usuários simultâneos")
+    parser.add_argument('--consultas', type=int, default=5, help="consultas de disponibilidade e relatório por usuário")
+    parser.add_argument('--dias', type=int, default=30, help="janela de dias usada para agendar e consultar")
+    parser.add_argument('--servidor', choices=('flask', 'uvicorn'), default='flask')
+    parser.add_argument('--workers', type=int, default=1, help="processos do uvicorn (use --estados sqlite com mais de um)")
+    parser.add_argument('--estados', choices=('memoria', 'sqlite'), default='memoria')
+    parser.add_argument('--porta', type=int, default=0, help="0 escolhe uma porta livre")
+    parser.add_argument('--semente', type=int, default=1)
+    parser.add_argument('--tempo-limite', type=float, default=30.0, help="segundos por requisição")
+    parser.add_argument('--tempo-inicio', type=float, default=120.0, help="segundos para o servidor ficar pronto")
+    parser.add_argument('--saida', help="arquivo JSON de resultado (padrão: benchmarks/resultados/carga-<data>.json)")
+    parser.add_argument('--manter-banco', action='store_true')
+    argumentos = parser.parse_args()
+
+    resultado = executar(argumentos)
+    saida = argumentos.saida or os.path.join(
+        PASTA_RESULTADOS, f"carga-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(saida)), exist_ok=True)
+    with open(saida, 'w', encoding='utf-8') as arquivo:
+        json.dump(resultado, arquivo, ensure_ascii=False, indent=2)
+    imprimir_resumo(resultado)
+    print(f"\nResultado gravado em {saida}")
+
+if __name__ == "__main__":
+    main()
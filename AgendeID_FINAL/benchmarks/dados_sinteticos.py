@@ -0,0 +1,230 @@
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+import unicodedata
+from datetime import date, timedelta
+from typing import Callable, Dict, List
+
+RAIZ_PROJETO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ_PROJETO not in sys.path:
+    sys.path.insert(0, RAIZ_PROJETO)
+
+from backend import database
+from backend.database import (
+    criar_banco, fechar_conexoes, validar_cpf, reconstruir_estatisticas_diarias, HORARIOS_ATENDIMENTO
+)
+from backend.migracoes import gatilhos_das_migracoes
+from backend.senhas import gerar_hash_senha
+
+# Massa de dados sintética em escala de produção para usuarios e agendamentos:
+#
+#   python benchmarks/dados_sinteticos.py --banco /tmp/escala.db --usuarios 200000 --agendamentos 2000000
+#
+# CPFs válidos (conferidos por validar_cpf) e únicos, datas espalhadas em dias úteis, serviços,
+# status e clientes com distribuição desigual (poucos clientes concentram muitos agendamentos).
+# As linhas entram em lotes com executemany, uma transação por lote. Os gatilhos de
+# estatisticas_diarias e versao_dados ficam desligados durante a carga e, ao final, são
+# recriados a partir das migrações e as estatísticas são recalculadas de uma vez.
+#
+# A carga exige o banco só para si: a conexão trava o arquivo em modo exclusivo até o fim e a
+# geração é recusada se outro processo (a aplicação, por exemplo) estiver com o banco aberto.
+# Se a carga for interrompida sem devolver os gatilhos, criar_banco() os recria na próxima
+# inicialização e recalcula as estatísticas.
+#
+# Cada data e horário tem no máximo uma reserva ativa (índice idx_agendamentos_vaga_ativa);
+# as demais linhas do mesmo horário são canceladas ou faltas, como em um balcão lotado.
+
+SENHA_SINTETICA = 'senha-sintetica'
+
+NOMES = ('Ana', 'Bruno', 'Carla', 'Daniel', 'Eduarda', 'Felipe', 'Gabriela', 'Henrique', 'Isabela', 'João',
+         'Larissa', 'Marcos', 'Natália', 'Otávio', 'Paula', 'Rafael', 'Sofia', 'Tiago', 'Vitória', 'William')
+SOBRENOMES = ('Silva', 'Santos', 'Oliveira', 'Souza', 'Rodrigues', 'Ferreira', 'Alves', 'Pereira', 'Lima',
+              'Gomes', 'Costa', 'Ribeiro', 'Martins', 'Carvalho', 'Almeida', 'Lopes', 'Soares', 'Barbosa')
+
+# Pesos relativos: poucos serviços concentram a maior parte da demanda
+SERVICOS = {'RG': 40, 'CNH': 25, 'CPF': 15, 'Passaporte': 10, 'Título de eleitor': 6, 'Carteira de trabalho': 4}
+STATUS_PASSADO_ATIVO = {'Presente': 70, 'Atendido': 25, 'Agendado': 5}
+STATUS_PASSADO_INATIVO = {'Cancelado': 55, 'Faltou': 45}
+
+# Chance de a primeira reserva de um horário não comparecer ou ser cancelada
+CHANCE_PRIMEIRA_INATIVA = 0.15
+
+def cpf_da_sequencia(posicao: int) -> str:
+    # Multiplicar por um número coprimo com 10^9 embaralha a sequência sem repetir a base
+    base = [int(digito) for digito in f"{(posicao * 387420489 + 123456789) % 1_000_000_000:09d}"]
+    for peso in (10, 11):
+        resto = 11 - sum(digito * (peso - i) for i, digito in enumerate(base)) % 11
+        base.append(0 if resto > 9 else resto)
+    return ''.join(map(str, base))
+
+def conexao_exclusiva(caminho: str) -> sqlite3.Connection:
+    # Em WAL, qualquer outra conexão aberta (mesmo ociosa) impede a trava exclusiva
+    conexao = sqlite3.connect(caminho, timeout=0)
+    conexao.execute("PRAGMA locking_mode = EXCLUSIVE")
+    try:
+        conexao.execute("BEGIN EXCLUSIVE")
+        conexao.commit()
+    except sqlite3.OperationalError:
+        conexao.close()
+        raise RuntimeError(f"O banco {caminho} está em uso; encerre a aplicação antes de gerar dados.")
+    return conexao
+
+def _sem_acentos(texto: str) -> str:
+    return unicodedata.normalize('NFKD', texto.lower()).encode('ascii', 'ignore').decode('ascii')
+
+def _lotes(total: int, lote: int):
+    for inicio in range(0, total, lote):
+        yield min(lote, total - inicio)
+
+def inserir_usuarios(conexao, aleatorio: random.Random, quantidade: int, lote: int, progresso: Callable[[str], None]) -> List[str]:
+    senha_hash = gerar_hash_senha(SENHA_SINTETICA)
+    proximo_id = conexao.execute("SELECT COALESCE(MAX(id), 0) FROM usuarios").fetchone()[0] + 1
+    posicao_cpf = proximo_id
+    emails = []
+    for tamanho in _lotes(quantidade, lote):
+        linhas = []
+        for _ in range(tamanho):
+            cpf = cpf_da_sequencia(posicao_cpf)
+            posicao_cpf += 1
+            while not validar_cpf(cpf):
+                cpf = cpf_da_sequencia(posicao_cpf)
+                posicao_cpf += 1
+            nome, sobrenome = aleatorio.choice(NOMES), aleatorio.choice(SOBRENOMES)
+            email = f"{_sem_acentos(nome)}.{_sem_acentos(sobrenome)}.{proximo_id}@exemplo.com"
+            nascimento = date(1940, 1, 1) + timedelta(days=aleatorio.randint(0, 365 * 66))
+            linhas.append((
+                f"{nome} {aleatorio.choice(SOBRENOMES)} {sobrenome}",
+                aleatorio.choice(('masculino', 'feminino', 'outro')),
+                'Brasileira' if aleatorio.random() < 0.97 else 'Estrangeira',
+                nascimento.strftime('%d/%m/%Y'),
+                f"{aleatorio.choice(NOMES)} {sobrenome}",
+                cpf,
+                email,
+                senha_hash,
+                f"(61) 9{aleatorio.randint(1000, 9999)}-{aleatorio.randint(1000, 9999)}" if aleatorio.random() < 0.8 else None,
+                'funcionario' if aleatorio.random() < 0.002 else 'cliente'
+            ))
+            emails.append(email)
+            proximo_id += 1
+        conexao.executemany(
+            """
+            INSERT INTO usuarios (nome, sexo, nacionalidade, data_nascimento, nome_mae, cpf, email, senha, telefone, tipo)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            linhas
+        )
+        conexao.commit()
+        progresso(f"usuarios: {len(emails)}/{quantidade}")
+    return emails
+
+def inserir_agendamentos(conexao, aleatorio: random.Random, emails: List[str], quantidade: int, dias_passados: int,
+                         dias_futuros: int, lote: int, progresso: Callable[[str], None]) -> int:
+    hoje = date.today()
+    # Dias úteis com peso cheio, sábado com menos movimento e domingo fechado
+    dias, pesos = [], []
+    for deslocamento in range(-dias_passados, dias_futuros + 1):
+        dia = hoje + timedelta(days=deslocamento)
+        peso = (1.0, 1.0, 1.0, 1.0, 1.0, 0.4, 0.0)[dia.weekday()]
+        if peso:
+            dias.append(dia)
+            pesos.append(peso)
+    servicos, pesos_servicos = list(SERVICOS), list(SERVICOS.values())
+
+    # Horários com reserva ativa, inclusive os que já estavam no banco
+    ocupados = set(map(tuple, conexao.execute(
+        "SELECT data, horario FROM agendamentos WHERE status IN ('Agendado', 'Presente', 'Atendido')"
+    ).fetchall()))
+    protocolo = conexao.execute("SELECT COALESCE(MAX(id), 0) FROM agendamentos").fetchone()[0]
+
+    inseridos = 0
+    for tamanho in _lotes(quantidade, lote):
+        linhas = []
+        for dia, servico in zip(aleatorio.choices(dias, weights=pesos, k=tamanho),
+                                aleatorio.choices(servicos, weights=pesos_servicos, k=tamanho)):
+            data = dia.strftime('%d/%m/%Y')
+            horario = aleatorio.choice(HORARIOS_ATENDIMENTO)
+            passado = dia < hoje
+            if (data, horario) not in ocupados and aleatorio.random() >= CHANCE_PRIMEIRA_INATIVA:
+                ocupados.add((data, horario))
+                status = aleatorio.choices(list(STATUS_PASSADO_ATIVO), weights=list(STATUS_PASSADO_ATIVO.values()))[0] if passado else 'Agendado'
+            else:
+                status = aleatorio.choices(list(STATUS_PASSADO_INATIVO), weights=list(STATUS_PASSADO_INATIVO.values()))[0] if passado else 'Cancelado'
+            protocolo += 1
+            criado_em = dia - timedelta(days=aleatorio.randint(1, 45))
+            linhas.append((
+                # Quadrado do sorteio: os primeiros clientes concentram boa parte dos agendamentos
+                emails[int(len(emails) * aleatorio.random() ** 2)],
+                servico, data, horario, status, f"S{protocolo:09X}",
+                f"{criado_em.isoformat()} {aleatorio.randint(7, 20):02d}:{aleatorio.randint(0, 59):02d}:00"
+            ))
+        conexao.executemany(
+            """
+            INSERT INTO agendamentos (usuario_email, servico, data, horario, status, protocolo, data_criacao)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            linhas
+        )
+        conexao.commit()
+        inseridos += tamanho
+        progresso(f"agendamentos: {inseridos}/{quantidade}")
+    return inseridos
+
+def gerar_dados(usuarios: int, agendamentos: int, dias_passados: int = 730, dias_futuros: int = 60,
+                lote: int = 10000, semente: int = 1, progresso: Callable[[str], None] = print) -> Dict[str, int]:
+    if usuarios <= 0 and agendamentos > 0:
+        raise ValueError("Agendamentos precisam de pelo menos um usuário.")
+    if not criar_banco():
+        raise RuntimeError("Falha ao inicializar o banco de dados; a geração não será feita.")
+    # As conexões do próprio processo também contam como uso do banco
+    fechar_conexoes()
+    aleatorio = random.Random(semente)
+    gatilhos = gatilhos_das_migracoes()
+
+    conexao = conexao_exclusiva(database.BANCO_DADOS)
+    try:
+        conexao.execute("PRAGMA foreign_keys = ON")
+        for nome in gatilhos:
+            conexao.execute(f"DROP TRIGGER IF EXISTS {nome}")
+        conexao.commit()
+        try:
+            emails = inserir_usuarios(conexao, aleatorio, usuarios, lote, progresso)
+            inseridos = inserir_agendamentos(conexao, aleatorio, emails, agendamentos, dias_passados, dias_futuros, lote, progresso)
+        finally:
+            for comando in gatilhos.values():
+                conexao.execute(comando)
+            conexao.execute("UPDATE versao_dados SET versao = versao + 1 WHERE tabela = 'agendamentos'")
+            conexao.commit()
+    finally:
+        conexao.close()
+
+    linhas_estatisticas = reconstruir_estatisticas_diarias()
+    return {"usuarios": len(emails), "agendamentos": inseridos, "estatisticas_diarias": linhas_estatisticas}
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera usuários e agendamentos sintéticos em escala.")
+    parser.add_argument('--banco', required=True, help="arquivo SQLite de destino (criado se não existir)")
+    parser.add_argument('--usuarios', type=int, default=100000)
+    parser.add_argument('--agendamentos', type=int, default=1000000)
+    parser.add_argument('--dias-passados', type=int, default=730)
+    parser.add_argument('--dias-futuros', type=int, default=60)
+    parser.add_argument('--lote', type=int, default=10000, help="linhas por transação")
+    parser.add_argument('--semente', type=int, default=1)
+    argumentos = parser.parse_args()
+
+    database.BANCO_DADOS = argumentos.banco
+    inicio = time.perf_counter()
+    try:
+        resultado = gerar_dados(
+            argumentos.usuarios, argumentos.agendamentos, argumentos.dias_passados,
+            argumentos.dias_futuros, argumentos.lote, argumentos.semente
+        )
+    except RuntimeError as erro:
+        sys.exit(str(erro))
+    print(f"{resultado['usuarios']} usuários, {resultado['agendamentos']} agendamentos e "
+          f"{resultado['estatisticas_diarias']} linhas de estatísticas em {time.perf_counter() - inicio:.1f} s")
+
+if __name__ == "__main__":
+    main()
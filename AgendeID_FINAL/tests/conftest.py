@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+
+# Banco temporário definido antes de qualquer import de backend.database, que lê
+# AGENDEID_BANCO no carregamento do módulo
+RAIZ_PROJETO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.environ['AGENDEID_BANCO'] = os.path.join(tempfile.mkdtemp(prefix='agendeid-testes-'), 'banco.db')
+if RAIZ_PROJETO not in sys.path:
+    sys.path.insert(0, RAIZ_PROJETO)
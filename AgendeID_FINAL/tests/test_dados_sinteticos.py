@@ -0,0 +1,71 @@
+from backend.database import criar_banco, obter_conexao, validar_cpf
+from benchmarks.dados_sinteticos import gatilhos_das_migracoes, gerar_dados
+
+# Massa pequena gerada no banco temporário dos testes (conftest.py)
+
+def test_gera_dados_validos_e_restaura_gatilhos():
+    resultado = gerar_dados(usuarios=300, agendamentos=4000, dias_passados=60, dias_futuros=20,
+                            lote=1000, semente=7, progresso=lambda mensagem: None)
+    assert resultado['usuarios'] == 300
+    assert resultado['agendamentos'] == 4000
+
+    with obter_conexao() as conexao:
+        cpfs = [linha[0] for linha in conexao.execute("SELECT cpf FROM usuarios")]
+        assert len(cpfs) == len(set(cpfs)) == 300
+        assert all(validar_cpf(cpf) for cpf in cpfs)
+
+        # No máximo uma reserva ativa por data e horário
+        assert conexao.execute("""
+            SELECT COUNT(*) FROM (
+                SELECT 1 FROM agendamentos WHERE status IN ('Agendado', 'Presente', 'Atendido')
+                GROUP BY data, horario HAVING COUNT(*) > 1
+            )
+        """).fetchone()[0] == 0
+
+        # Estatísticas recalculadas ao final batem com a contagem direta
+        contagem = sorted(map(tuple, conexao.execute(
+            "SELECT data_iso, coalesce(status, ''), servico, COUNT(*) FROM agendamentos GROUP BY 1, 2, 3"
+        )))
+        estatisticas = sorted(map(tuple, conexao.execute(
+            "SELECT data_iso, status, servico, quantidade FROM estatisticas_diarias"
+        )))
+        assert contagem == estatisticas
+
+        gatilhos = {linha[0] for linha in conexao.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")}
+        assert set(gatilhos_das_migracoes()) <= gatilhos
+
+        # Com os gatilhos de volta, novas escritas continuam atualizando as estatísticas
+        versao = conexao.execute("SELECT versao FROM versao_dados WHERE tabela = 'agendamentos'").fetchone()[0]
+        conexao.execute("UPDATE agendamentos SET status = 'Cancelado' WHERE id = (SELECT MIN(id) FROM agendamentos)")
+        conexao.commit()
+        assert conexao.execute("SELECT versao FROM versao_dados WHERE tabela = 'agendamentos'").fetchone()[0] == versao + 1
+        contagem = sorted(map(tuple, conexao.execute(
+            "SELECT data_iso, coalesce(status, ''), servico, COUNT(*) FROM agendamentos GROUP BY 1, 2, 3"
+        )))
+        estatisticas = sorted(map(tuple, conexao.execute(
+            "SELECT data_iso, status, servico, quantidade FROM estatisticas_diarias"
+        )))
+        assert contagem == estatisticas
+
+def test_criar_banco_restaura_gatilhos_de_carga_interrompida():
+    with obter_conexao() as conexao:
+        for nome in gatilhos_das_migracoes():
+            conexao.execute(f"DROP TRIGGER IF EXISTS {nome}")
+        versao = conexao.execute("SELECT versao FROM versao_dados WHERE tabela = 'agendamentos'").fetchone()[0]
+        # Escrita feita enquanto os gatilhos estavam desligados
+        conexao.execute("DELETE FROM agendamentos WHERE id = (SELECT MAX(id) FROM agendamentos)")
+        conexao.commit()
+
+    assert criar_banco()
+
+    with obter_conexao() as conexao:
+        gatilhos = {linha[0] for linha in conexao.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")}
+        assert set(gatilhos_das_migracoes()) <= gatilhos
+        assert conexao.execute("SELECT versao FROM versao_dados WHERE tabela = 'agendamentos'").fetchone()[0] > versao
+        contagem = sorted(map(tuple, conexao.execute(
+            "SELECT data_iso, coalesce(status, ''), servico, COUNT(*) FROM agendamentos GROUP BY 1, 2, 3"
+        )))
+        estatisticas = sorted(map(tuple, conexao.execute(
+            "SELECT data_iso, status, servico, quantidade FROM estatisticas_diarias"
+        )))
+        assert contagem == estatisticas
@@ -0,0 +1,48 @@
+import os
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+
+from backend import migracoes
+
+RAIZ_PROJETO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@pytest.fixture
+def banco_com_reservas_em_conflito(tmp_path, monkeypatch):
+    # Banco na versão 3, anterior ao índice de reserva única, com duas reservas ativas no mesmo horário
+    caminho = str(tmp_path / 'conflito.db')
+    conexao = sqlite3.connect(caminho)
+    monkeypatch.setattr(migracoes, 'MIGRACOES', migracoes.MIGRACOES[:3])
+    migracoes.aplicar_migracoes(conexao)
+    conexao.execute("""
+        INSERT INTO usuarios (nome, sexo, nacionalidade, data_nascimento, nome_mae, cpf, email, senha)
+        VALUES ('Ana Souza', 'feminino', 'Brasileira', '01/01/1990', 'Maria Souza', '52998224725', 'ana@exemplo.com', 'x')
+    """)
+    for status in ('Agendado', 'Cancelado', 'Agendado'):
+        conexao.execute(
+            "INSERT INTO agendamentos (usuario_email, servico, data, horario, status) VALUES (?, 'RG', '02/11/2026', '10:00', ?)",
+            ('ana@exemplo.com', status)
+        )
+    conexao.commit()
+    conexao.close()
+    return caminho
+
+@pytest.mark.parametrize('modulo', ['app', 'asgi'])
+def test_servidor_nao_sobe_com_migracao_pendente(banco_com_reservas_em_conflito, modulo):
+    ambiente = dict(os.environ, AGENDEID_BANCO=banco_com_reservas_em_conflito)
+    processo = subprocess.run(
+        [sys.executable, '-c', f'import {modulo}'], cwd=RAIZ_PROJETO, env=ambiente,
+        capture_output=True, text=True, timeout=120
+    )
+    assert processo.returncode != 0
+    saida = processo.stdout + processo.stderr
+    assert '02/11/2026 10:00: agendamentos 1, 3' in saida
+    assert 'Falha ao inicializar o banco de dados' in saida
+
+    # As reservas não foram alteradas e o esquema continua na versão 3
+    conexao = sqlite3.connect(banco_com_reservas_em_conflito)
+    assert [linha[0] for linha in conexao.execute("SELECT status FROM agendamentos ORDER BY id")] == ['Agendado', 'Cancelado', 'Agendado']
+    assert migracoes.versao_atual(conexao) == 3
+    conexao.close()
@@ -0,0 +1,90 @@
+import ast
+import os
+import re
+import sqlite3
+
+import pytest
+
+from backend.migracoes import aplicar_migracoes
+
+# Plano de execução (EXPLAIN QUERY PLAN) de cada instrução SQL escrita nos módulos abaixo,
+# contra o esquema completo das migrações. Uma consulta do dia a dia que passe a percorrer
+# a tabela inteira (SCAN) faz o teste falhar: com milhões de agendamentos isso é o que
+# transforma uma requisição de milissegundos em segundos.
+
+RAIZ_PROJETO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ARQUIVOS = ('backend/database.py', 'backend/chatbot.py', 'app.py')
+
+INICIO_SQL = re.compile(r'^\s*(SELECT|INSERT|UPDATE|DELETE|WITH|REPLACE)\s+\S', re.IGNORECASE)
+
+# Instruções que percorrem tudo de propósito (manutenção, não atendem requisições): trecho -> motivo
+VARREDURAS_PERMITIDAS = {
+    "SELECT data_iso, coalesce(status, ''), servico, COUNT(*) FROM agendamentos":
+        "reconstrução de estatisticas_diarias (comando de manutenção)",
+    "SELECT COUNT(*) FROM estatisticas_diarias":
+        "contagem ao final da reconstrução de estatisticas_diarias",
+}
+
+def _normalizar(sql: str) -> str:
+    return ' '.join(sql.split())
+
+def instrucoes_sql():
+    # (arquivo, linha, sql) de cada literal de texto que começa como uma instrução SQL;
+    # modelos com {filtro} entram sem o filtro opcional
+    for arquivo in ARQUIVOS:
+        with open(os.path.join(RAIZ_PROJETO, arquivo), encoding='utf-8') as fonte:
+            arvore = ast.parse(fonte.read(), filename=arquivo)
+        for no in ast.walk(arvore):
+            if isinstance(no, ast.Constant) and isinstance(no.value, str) and INICIO_SQL.match(no.value):
+                yield arquivo, no.lineno, no.value.replace('{filtro}', '')
+
+INSTRUCOES = list(instrucoes_sql())
+
+@pytest.fixture(scope='module')
+def esquema():
+    conexao = sqlite3.connect(':memory:')
+    aplicar_migracoes(conexao)
+    yield conexao
+    conexao.close()
+
+def plano(conexao: sqlite3.Connection, sql: str):
+    return [linha[3] for linha in conexao.execute('EXPLAIN QUERY PLAN ' + sql, [None] * sql.count('?'))]
+
+def varredura_permitida(sql: str) -> bool:
+    normalizado = _normalizar(sql)
+    return any(trecho in normalizado for trecho in VARREDURAS_PERMITIDAS)
+
+def test_extrai_instrucoes_dos_tres_modulos():
+    arquivos = {arquivo for arquivo, _, _ in INSTRUCOES}
+    assert arquivos == set(ARQUIVOS)
+    assert len(INSTRUCOES) >= 25
+
+@pytest.mark.parametrize(
+    'arquivo, linha, sql', INSTRUCOES,
+    ids=[f"{arquivo}:{linha}" for arquivo, linha, _ in INSTRUCOES]
+)
+def test_consulta_sem_varredura_completa(esquema, arquivo, linha, sql):
+    detalhes = plano(esquema, sql)
+    varreduras = [detalhe for detalhe in detalhes if detalhe.startswith('SCAN ')]
+    if varreduras and varredura_permitida(sql):
+        pytest.skip(f"varredura esperada: {varreduras}")
+    assert not varreduras, f"{arquivo}:{linha} percorre a tabela inteira: {detalhes}\n{_normalizar(sql)}"
+
+def test_varreduras_permitidas_ainda_existem():
+    # Um trecho que não corresponde a nenhuma instrução ficou obsoleto e deve sair da lista
+    normalizadas = [_normalizar(sql) for _, _, sql in INSTRUCOES]
+    for trecho in VARREDURAS_PERMITIDAS:
+        assert any(trecho in sql for sql in normalizadas), trecho
+
+def test_paginas_usam_indice_sem_ordenacao_temporaria(esquema):
+    # Listagens paginadas por chave: cada página é um trecho do índice, sem ordenar o resultado
+    from backend.database import SQL_AGENDAMENTOS_USUARIO, SQL_RELATORIO_AGENDAMENTOS
+    casos = (
+        (SQL_AGENDAMENTOS_USUARIO, "AND (data_iso, horario, id) > (?, ?, ?)"),
+        (SQL_RELATORIO_AGENDAMENTOS + " LIMIT ?", "AND (a.data_iso, a.horario, a.id) > (?, ?, ?)"),
+    )
+    for modelo, filtro in casos:
+        for sql in (modelo.format(filtro=''), modelo.format(filtro=filtro)):
+            detalhes = plano(esquema, sql)
+            assert not any('TEMP B-TREE' in detalhe for detalhe in detalhes), detalhes
+            assert detalhes[0].startswith('SEARCH'), detalhes
@@ -0,0 +1,54 @@
+import os
+
+import pytest
+from itsdangerous import URLSafeTimedSerializer
+
+# Sem limites de requisições e com o cookie de sessão aceito em HTTP (cliente de testes)
+os.environ['AGENDEID_LIMITES'] = '0'
+os.environ['AGENDEID_COOKIE_SEGURO'] = '0'
+
+import app as aplicacao
+
+TOKEN_ADMIN = 'token-de-implantacao'
+
+@pytest.fixture
+def recargas(monkeypatch):
+    monkeypatch.setenv('AGENDEID_TOKEN_ADMIN', TOKEN_ADMIN)
+    chamadas = []
+    monkeypatch.setattr(aplicacao.chatbot, 'recarregarEmSegundoPlano', lambda: chamadas.append(1))
+    return chamadas
+
+@pytest.fixture
+def cliente():
+    return aplicacao.app.test_client()
+
+def _entrar(cliente, tipo: str) -> str:
+    # Sessão logada com um token CSRF; devolve o token assinado que o formulário enviaria
+    with cliente.session_transaction() as sessao:
+        sessao['usuario'] = {'email': f'{tipo}@exemplo.com', 'nome': 'Teste', 'tipo': tipo}
+        sessao['tipo'] = tipo
+        sessao['csrf_token'] = 'token-csrf-da-sessao'
+    return URLSafeTimedSerializer(aplicacao.app.secret_key, salt='wtf-csrf-token').dumps('token-csrf-da-sessao')
+
+def test_recarga_com_token_admin(cliente, recargas):
+    resposta = cliente.post('/admin/recarregar', headers={'X-Admin-Token': TOKEN_ADMIN})
+    assert resposta.status_code == 202
+    assert recargas == [1]
+
+@pytest.mark.parametrize('cabecalhos', [{}, {'X-Admin-Token': 'errado'}, {'X-Admin-Token': 'tokén'}])
+def test_recarga_sem_token_valido_nem_sessao(cliente, recargas, cabecalhos):
+    assert cliente.post('/admin/recarregar', headers=cabecalhos).status_code == 403
+    assert recargas == []
+
+def test_recarga_por_cliente_e_negada(cliente, recargas):
+    token_csrf = _entrar(cliente, 'cliente')
+    assert cliente.post('/admin/recarregar', headers={'X-CSRFToken': token_csrf}).status_code == 403
+    assert recargas == []
+
+def test_recarga_por_funcionario_exige_csrf(cliente, recargas):
+    token_csrf = _entrar(cliente, 'funcionario')
+    assert cliente.post('/admin/recarregar').status_code == 400
+    assert recargas == []
+
+    assert cliente.post('/admin/recarregar', headers={'X-CSRFToken': token_csrf}).status_code == 202
+    assert recargas == [1]